@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+
+
+class AccessLogWriter:
+    """
+    Writes access events to the `access` table from a background thread.
+
+    log() only puts the event on a bounded in-process queue, so the login
+    request never waits on the database. The writer drains the queue in
+    batches and hands each batch to `write_batch` in one call. When the
+    queue is full new events are dropped and counted rather than blocking
+    requests. flush() and stop() write out whatever is still queued.
+
+    Args:
+        write_batch (callable): Inserts a list of event tuples (the store's insert_access).
+        max_queue (int): Events buffered before new ones are dropped.
+        batch_size (int): Most rows written per INSERT.
+        flush_interval (float): Longest time an event waits before being written.
+    """
+
+    def __init__(self, write_batch, max_queue=10000, batch_size=200, flush_interval=2.0):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._write_lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'failed_batches': 0}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='access-log-writer', daemon=True)
+        self._thread.start()
+
+    def log(self, user_id, access_level, ip_address, os_name, user_agent, created_at=None):
+        event = (user_id, access_level, ip_address, os_name, user_agent,
+                 time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created_at or time.time())))
+        try:
+            self._queue.put_nowait(event)
+            self.stats['queued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def _take_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._write_lock:
+            self.write_batch(batch)
+        self.stats['written'] += len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(self.flush_interval)
+            try:
+                self._write(batch)
+            except Exception as e:
+                self.stats['failed_batches'] += 1
+                print(f"Erro ao gravar acessos: {e}")
+
+    def flush(self):
+        """Writes everything queued right now, from the calling thread."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Erro ao gravar acessos: {e}")
@@ -1,21 +1,47 @@
 import os
-import platform
 import subprocess
-import bcrypt
 import psutil
-import mysql.connector
-import shutil
-import getpass
-import socket
+import threading
 from datetime import datetime
-from flask import Flask, redirect, session, url_for, render_template, request, flash, send_from_directory
+from flask import Flask, redirect, session, url_for, render_template, request, flash, send_from_directory, send_file, jsonify, Response, stream_with_context, g, before_render_template, template_rendered
 from werkzeug.utils import secure_filename
 import dockers
 import applications
+import storage
+import sampler
+import host_metrics
+import chunked_upload
+import archive_stream
+import file_listing
+import search_index
+import fs_watcher
+import jobs
+import file_ops
+import dedup
+import folder_sizes
+import health
+import host_facts
+import terminal
+import base64
+import access_log
+import atexit
+import passwords
+import wallpapers
+import thumbnails
 import time
+import dotenv
+import hmac
+import metrics
+import vendor_assets
+
+# Load environment variables
+dotenv.load_dotenv()
 
 # Configuration
-UPLOAD_FOLDER = 'uploads/'  # Directory where files will be stored
+# Directory where files will be stored. Absolute, because send_from_directory
+# resolves relative paths against the app's folder and everything else against
+# the working directory.
+UPLOAD_FOLDER = os.path.abspath('uploads')
 NOT_ALLOWED_EXTENSIONS = {
     # Executables
     '.exe', '.bat', '.cmd', '.sh', '.bin', '.msi', '.com', '.scr',
@@ -38,257 +64,451 @@ NOT_ALLOWED_EXTENSIONS = {
 
 ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
 
+# Folders under UPLOAD_FOLDER used by the server itself, never listed
+CHUNKED_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, '.chunked_uploads')
+TRASH_FOLDER = os.path.join(UPLOAD_FOLDER, '.trash')
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, '.blobs')
+INTERNAL_FOLDERS = {'.chunked_uploads', '.trash', '.blobs'}
+# Store identical uploads once, as hardlinks to a content-addressed blob
+DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', '').lower() in ('1', 'true', 'yes')
+DEDUP_MIN_SIZE = int(os.environ.get('DEDUP_MIN_SIZE', 64 * 1024))
+# Seconds deleted files and folders stay in the trash before being purged
+TRASH_RETENTION = float(os.environ.get('TRASH_RETENTION', 0))
+FILE_OP_WORKERS = int(os.environ.get('FILE_OP_WORKERS', 2))
+QUOTA_CACHE_TTL = float(os.environ.get('QUOTA_CACHE_TTL', 60))
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+FILES_PAGE_SIZE = int(os.environ.get('FILES_PAGE_SIZE', 200))
+SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', 'search_index.db')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 10))
+HEALTH_INTERVAL = float(os.environ.get('HEALTH_INTERVAL', 10))
+HEALTH_TTL = float(os.environ.get('HEALTH_TTL', 30))
+TERMINAL_MAX_SESSIONS = int(os.environ.get('TERMINAL_MAX_SESSIONS', 4))
+TERMINAL_SCROLLBACK = int(os.environ.get('TERMINAL_SCROLLBACK', 256 * 1024))
+TERMINAL_IDLE_TIMEOUT = float(os.environ.get('TERMINAL_IDLE_TIMEOUT', 15 * 60))
+TERMINAL_MAX_RUNTIME = float(os.environ.get('TERMINAL_MAX_RUNTIME', 4 * 3600))
+# Every open terminal holds one request thread while its output streams
+TERMINAL_MAX_STREAMS = int(os.environ.get('TERMINAL_MAX_STREAMS', 4))
+TERMINAL_MAX_STREAMS_PER_USER = int(os.environ.get('TERMINAL_MAX_STREAMS_PER_USER', 2))
+PROMPT_TIMEOUT = float(os.environ.get('PROMPT_TIMEOUT', 60))
+PROMPT_MAX_OUTPUT = 1024 * 1024
+ACCESS_LOG_QUEUE = int(os.environ.get('ACCESS_LOG_QUEUE', 10000))
+ACCESS_LOG_BATCH = int(os.environ.get('ACCESS_LOG_BATCH', 200))
+ACCESS_HISTORY_PAGE_SIZE = 50
+USERS_PAGE_SIZE = int(os.environ.get('USERS_PAGE_SIZE', 50))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 2))
+BCRYPT_MAX_QUEUE = int(os.environ.get('BCRYPT_MAX_QUEUE', 16))
+BCRYPT_COST = int(os.environ['BCRYPT_COST']) if os.environ.get('BCRYPT_COST') else None
+BCRYPT_TARGET_MS = float(os.environ.get('BCRYPT_TARGET_MS', 250))
+WALLPAPER_FOLDER = 'static/wallpapers/'
+WALLPAPER_VARIANTS_FOLDER = 'static/wallpaper_variants/'
+WALLPAPER_QUALITY = int(os.environ.get('WALLPAPER_QUALITY', 80))
+THUMBNAIL_CACHE_FOLDER = os.environ.get('THUMBNAIL_CACHE_FOLDER', 'thumbnail_cache/')
+THUMBNAIL_CACHE_SIZE = int(os.environ.get('THUMBNAIL_CACHE_SIZE', 256 * 1024 * 1024))
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+THUMBNAIL_SIZE = 256
+# Requests slower than this are logged with a per-phase breakdown, 0 disables the log
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 0))
+# Lets a Prometheus scraper read /metrics with 'Authorization: Bearer <token>' instead of a session
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Static files without a content hash in their name still get revalidated after this
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 86400))
+
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.secret_key = os.environ.get('SECRET_KEY')  # Ensure there's a fallback key for development
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Let a fronting nginx/Apache send files itself with X-Sendfile
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
 
 HOST_DB = os.environ.get('HOST_DB')
 USER_DB = os.environ.get('USER_DB')
 PASS_DB = os.environ.get('PASS_DB')
 DB = os.environ.get('DB')
-
-# Database Functions
-def get_db_connection():
-    return mysql.connector.connect(
-        host=HOST_DB,
-        user=USER_DB,
-        password=PASS_DB,
-        database=DB
-    )
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = float(os.environ.get('DB_POOL_RECYCLE', 300))
+# 'mysql' (default) or 'sqlite' for an embedded database without a server
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mysql').lower()
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'homefusion.db')
+
+password_hasher = passwords.PasswordHasher(workers=BCRYPT_WORKERS,
+                                           max_queue=BCRYPT_MAX_QUEUE,
+                                           cost=BCRYPT_COST,
+                                           target_ms=BCRYPT_TARGET_MS)
+login_throttle = passwords.LoginThrottle()
+
+store = storage.open_store(STORAGE_BACKEND,
+                           sqlite_path=SQLITE_PATH,
+                           pool_options={'size': DB_POOL_SIZE,
+                                         'max_overflow': DB_POOL_MAX_OVERFLOW,
+                                         'timeout': DB_POOL_TIMEOUT,
+                                         'recycle': DB_POOL_RECYCLE},
+                           host=HOST_DB,
+                           user=USER_DB,
+                           password=PASS_DB,
+                           database=DB)
+
+SAMPLER_INTERVAL = float(os.environ.get('SAMPLER_INTERVAL', 2))
+SAMPLER_HISTORY = float(os.environ.get('SAMPLER_HISTORY', 3600))
+
+host_collector = host_metrics.HostMetricsCollector() if os.path.isdir('/proc') else None
+metrics_sampler = sampler.MetricsSampler(interval=SAMPLER_INTERVAL,
+                                         history_seconds=SAMPLER_HISTORY,
+                                         collector=host_collector)
+
+upload_manager = chunked_upload.ChunkedUploadManager(CHUNKED_UPLOAD_FOLDER, chunk_size=UPLOAD_CHUNK_SIZE)
+listing_cache = file_listing.DirectoryListingCache(hidden=INTERNAL_FOLDERS)
+
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+file_index = search_index.FileSearchIndex(SEARCH_INDEX_PATH, UPLOAD_FOLDER, excluded=INTERNAL_FOLDERS)
+upload_watcher = fs_watcher.FileSystemWatcher(UPLOAD_FOLDER, excluded=INTERNAL_FOLDERS)
+upload_watcher.subscribe(file_index.handle_event)
+folder_usage = folder_sizes.FolderSizes(UPLOAD_FOLDER, excluded=INTERNAL_FOLDERS)
+upload_watcher.subscribe(folder_usage.handle_event)
+
+job_runner = jobs.JobRunner(workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING)
+
+# Copies get their own workers so a big one never holds up an install
+file_jobs = jobs.JobRunner(workers=FILE_OP_WORKERS, max_pending=JOB_MAX_PENDING)
+blob_store = dedup.BlobStore(UPLOAD_FOLDER, BLOB_FOLDER, excluded=INTERNAL_FOLDERS,
+                             min_size=DEDUP_MIN_SIZE) if DEDUP_ENABLED else None
+# Purging the trash drops links, blobs nothing links to anymore go with it
+file_operations = file_ops.FileOperations(TRASH_FOLDER, file_jobs, retention=TRASH_RETENTION,
+                                          on_purge=blob_store.collect if blob_store else None)
+file_operations.subscribe(file_index.handle_event)
+file_operations.subscribe(folder_usage.handle_event)
+
+service_health = health.HealthProber(interval=HEALTH_INTERVAL, ttl=HEALTH_TTL)
+service_health.register('open-webui', 8080)
+service_health.register('ollama', 11434)
+
+host_info = host_facts.facts
+
+terminals = terminal.TerminalManager(max_sessions=TERMINAL_MAX_SESSIONS,
+                                     scrollback=TERMINAL_SCROLLBACK,
+                                     idle_timeout=TERMINAL_IDLE_TIMEOUT,
+                                     max_runtime=TERMINAL_MAX_RUNTIME,
+                                     max_streams=TERMINAL_MAX_STREAMS,
+                                     max_streams_per_owner=TERMINAL_MAX_STREAMS_PER_USER)
+
+wallpaper_assets = wallpapers.WallpaperAssets(WALLPAPER_FOLDER, WALLPAPER_VARIANTS_FOLDER,
+                                              url_prefix='/' + WALLPAPER_VARIANTS_FOLDER,
+                                              quality=WALLPAPER_QUALITY)
+
+thumbnail_cache = thumbnails.ThumbnailCache(THUMBNAIL_CACHE_FOLDER,
+                                            max_bytes=THUMBNAIL_CACHE_SIZE,
+                                            size=THUMBNAIL_SIZE,
+                                            workers=THUMBNAIL_WORKERS)
 
 def create_folder(folder_name):
     folder_path = os.path.join(app.config['UPLOAD_FOLDER'], folder_name)
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
 
-def list_files_and_folders(path):
-    """ List all files and folders in a directory. """
+def list_files_and_folders(path, sort='name', order='asc', cursor=None, limit=None):
+    """ List one page of files and folders in a directory, folders first. """
     try:
         if not os.path.exists(path):
             raise FileNotFoundError("The directory does not exist.")
-        entries = os.listdir(path)
-        files = [entry for entry in entries if os.path.isfile(os.path.join(path, entry))]
-        folders = [entry for entry in entries if os.path.isdir(os.path.join(path, entry))]
-        return files, folders
+        page = listing_cache.page(path, sort=sort, order=order, cursor=cursor, limit=limit or FILES_PAGE_SIZE)
+        files = [entry for entry in page['entries'] if not entry['is_dir']]
+        folders = [entry for entry in page['entries'] if entry['is_dir']]
+        return files, folders, page['next_cursor']
     except Exception as e:
         flash('Error retrieving files and folders: ' + str(e), 'danger')
-        return [], []
+        return [], [], None
 
 
+# Database Functions (the SQL itself lives in storage.DataStore)
 def create_user(username, password):
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-            cursor.execute("""
-                INSERT INTO users (username, password) VALUES (%s, %s)
-            """, (username, hashed_password.decode('utf-8')))
-            connection.commit()
-    finally:
-        connection.close()
+    store.create_user(username, password_hasher.hash(password))
 
 def get_users_by_name(username):
-    connection = get_db_connection()
+    return store.search_users(username, substring=True, limit=USERS_PAGE_SIZE)[0]
+
+def search_users(query='', after=None, substring=False, limit=USERS_PAGE_SIZE):
+    """Returns (users, next_after), one page of the user directory ordered by username."""
+    return store.search_users(query, after=after, limit=limit, substring=substring)
+
+def upgrade_database():
+    """Adds the tables newer versions need and indexes users for substring search."""
     try:
-        with connection.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id, username FROM users WHERE username LIKE %s", ("%" + username + "%",))
-            return cursor.fetchall()
-    finally:
-        connection.close()
+        store.create_added_tables()
+        store.index_user_trigrams()
+    except Exception as e:
+        print(f"Erro ao atualizar a base de dados: {e}")
 
 def get_all_users():
-    connection = get_db_connection()
-    try:
-        with connection.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT id, username FROM users")
-            users = cursor.fetchall()
-            return users if users else []
-    finally:
-        connection.close()
+    return store.get_all_users()
 
 def delete_user(user_id):
-    connection = get_db_connection()
-    try:
-        with connection.cursor(dictionary=True) as cursor:
-            # Verifica o número total de usuários
-            cursor.execute("SELECT COUNT(*) as total FROM users")
-            result = cursor.fetchone()
-            if result['total'] <= 1:
-                raise Exception("Cannot delete the last remaining user.")
-
-            # Exclui o usuário especificado
-            cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
-            connection.commit()
-    finally:
-        connection.close()
+    store.delete_user(user_id)
+    invalidate_preference_cache(user_id)
 
 def update_user_password(user_id, new_password):
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-            cursor.execute("UPDATE users SET password = %s WHERE id = %s", 
-                           (hashed_password.decode('utf-8'), user_id))
-            connection.commit()
-    finally:
-        connection.close()
+    store.update_user_password(user_id, password_hasher.hash(new_password))
+
+PREFERENCE_CACHE_TTL = float(os.environ.get('PREFERENCE_CACHE_TTL', 300))
+
+# user_id -> (wallpaper_path, theme, cached_at)
+preference_cache = {}
+preference_cache_lock = threading.Lock()
+
+def invalidate_preference_cache(user_id):
+    with preference_cache_lock:
+        preference_cache.pop(user_id, None)
 
 def apply_wallpaper_and_theme(user_id, wallpaper_path, theme):
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO wallpapers_and_theme_for_user (user_id, wallpaper_path, theme) 
-                VALUES (%s, %s, %s)
-            """, (user_id, wallpaper_path, theme))
-            connection.commit()
-    finally:
-        connection.close()
+    store.apply_wallpaper_and_theme(user_id, wallpaper_path, theme)
+    invalidate_preference_cache(user_id)
 
 def get_last_applied_wallpaper_and_theme(user_id):
-    connection = get_db_connection()
-    try:
-        with connection.cursor(dictionary=True) as cursor:
-            cursor.execute("""
-                SELECT * FROM wallpapers_and_theme_for_user 
-                WHERE user_id = %s ORDER BY applied_at DESC LIMIT 1
-            """, (user_id,))
-            return cursor.fetchone()
-    finally:
-        connection.close()
+    return store.get_last_applied_wallpaper_and_theme(user_id)
 
 def get_selected_wallpaper_and_theme(user_id):
-    connection = get_db_connection()
-    try:
-        with connection.cursor(dictionary=True) as cursor:
-            cursor.execute("""
-                SELECT wallpaper_path, theme 
-                FROM wallpapers_and_theme_for_user 
-                WHERE user_id = %s 
-                ORDER BY applied_at DESC LIMIT 1
-            """, (user_id,))
-            result = cursor.fetchone()
-            if result:
-                selected_wallpaper_path = "static/wallpapers/" + result['wallpaper_path']
-                selected_theme = result['theme']
-            else:
-                selected_wallpaper_path = ""
-                selected_theme = ""
-    finally:
-        connection.close()
+    with preference_cache_lock:
+        cached = preference_cache.get(user_id)
+    if cached and time.monotonic() - cached[2] < PREFERENCE_CACHE_TTL:
+        return cached[0], cached[1]
+
+    result = store.get_preferences(user_id)
+    if result:
+        selected_wallpaper_path = "static/wallpapers/" + (result['wallpaper_path'] or "")
+        selected_theme = result['theme']
+    else:
+        selected_wallpaper_path = ""
+        selected_theme = ""
+
+    with preference_cache_lock:
+        preference_cache[user_id] = (selected_wallpaper_path, selected_theme, time.monotonic())
     return selected_wallpaper_path, selected_theme
 
 def log_user_access(user_id, access_level):
+    """Queues the access event, the background writer inserts it in a batch."""
     ip_address, os_name, user_agent = get_device_info()
-    connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO access (user_id, access_level, ip_address, os_name, user_agent, created_at)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-            """, (user_id, access_level, ip_address, os_name, user_agent))
-            connection.commit()
-    finally:
-        connection.close()
+    access_writer.log(user_id, access_level, ip_address, os_name, user_agent)
+
+def get_access_history(user_id=None, since=None, until=None, before=None, limit=ACCESS_HISTORY_PAGE_SIZE):
+    """
+    Returns (rows, next_before) newest first.
+
+    `before` is the (created_at, id) of the last row of the previous page,
+    pass next_before back to get the following page.
+    """
+    rows = store.access_history(user_id=user_id, since=since, until=until, before=before, limit=limit + 1)
+    next_before = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_before = (last['created_at'].strftime('%Y-%m-%d %H:%M:%S'), last['id'])
+    return rows, next_before
+
+access_writer = access_log.AccessLogWriter(store.insert_access, max_queue=ACCESS_LOG_QUEUE, batch_size=ACCESS_LOG_BATCH)
+atexit.register(access_writer.stop)
+
+# Background services
+services_started = False
+services_lock = threading.Lock()
+
+def start_background_services():
+    """
+    Starts the samplers, watchers, probes and writers of this process.
+
+    Nothing is started at import: threads do not survive a fork, so every
+    worker process starts its own, from the launcher's post-worker-init
+    hook or at the latest on its first request. Safe to call repeatedly.
+    """
+    global services_started
+    with services_lock:
+        if services_started:
+            return
+        services_started = True
+    # Calibrate the bcrypt cost now rather than on the first login
+    threading.Thread(target=lambda: password_hasher.cost, name='bcrypt-calibration', daemon=True).start()
+    # Databases from older versions get the new tables, and their users indexed for search
+    threading.Thread(target=upgrade_database, name='database-upgrade', daemon=True).start()
+    metrics_sampler.start()
+    file_index.open()
+    folder_usage.start()
+    upload_watcher.start()
+    dockers.engine.start()
+    service_health.start()
+    host_info.start()
+    terminals.start()
+    wallpaper_assets.start()
+    access_writer.start()
+    file_operations.start()
+    if blob_store and blob_store.claim_first_scan():
+        # Files uploaded before deduplication was turned on; later ones are scanned from the storage page
+        file_jobs.submit('Deduplicate uploads', blob_store.scan)
+
+def stop_background_services():
+    """Flushes the writers and closes the PTYs and pools on a graceful shutdown."""
+    for stop in (access_writer.stop, terminals.close_all, metrics_sampler.stop, upload_watcher.stop,
+                 dockers.engine.stop, service_health.stop, host_info.stop, password_hasher.shutdown,
+                 thumbnail_cache.shutdown, lambda: job_runner.shutdown(wait=False), file_operations.stop,
+                 lambda: file_jobs.shutdown(wait=False), store.close):
+        try:
+            stop()
+        except Exception as e:
+            print(f"Erro ao parar os serviços: {e}")
 
 # Utility Functions
 def allowed_file(filename):
     file_ext = os.path.splitext(filename)[1].lower()
     return file_ext not in NOT_ALLOWED_EXTENSIONS
 
-def check_docker_installed():
-    try:
-        result = subprocess.run(['docker', '--version'], shell=True, capture_output=True, text=True, check=True)
-        # Se o comando for bem-sucedido, o Docker está instalado
-        print("Docker está instalado:")
-        print(result.stdout)
-        return True
-    except subprocess.CalledProcessError as e:
-        print("Docker não está instalado. Detalhes:")
-        print(e.stderr)
-        return False
-    except FileNotFoundError:
-        # Se o comando não for encontrado, o Docker não está instalado
-        print("Docker não está instalado. O comando 'docker' não foi encontrado.")
-        return False
+def is_inside_upload_folder(path):
+    upload_root = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    return os.path.commonpath([upload_root, os.path.abspath(path)]) == upload_root
 
-def get_local_ip():
+def record_path(path):
+    """Brings the search index and the folder sizes up to date with a new or changed path."""
+    file_index.update_path(path)
+    folder_usage.update_path(path)
+
+def entry_size(path):
+    """Bytes of a file, or of a folder and everything in it, without walking it."""
+    if os.path.isdir(path):
+        usage = folder_usage.get(path)
+        return usage['bytes'] if usage else 0
     try:
-        # Conecta-se a um servidor externo (por exemplo, Google DNS) para obter o IP local
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+# Storage quotas: each one caps the bytes under a folder (usually a user's own)
+quota_cache = None
+quota_cache_lock = threading.Lock()
+
+def invalidate_quota_cache():
+    global quota_cache
+    with quota_cache_lock:
+        quota_cache = None
+
+def get_quotas():
+    global quota_cache
+    with quota_cache_lock:
+        cached = quota_cache
+    if cached and time.monotonic() - cached[1] < QUOTA_CACHE_TTL:
+        return cached[0]
+    try:
+        quotas = store.list_quotas()
     except Exception as e:
-        return f"Erro ao tentar obter o IP local: {e}"
-    
-    return ip
+        print(f"Erro ao ler as quotas: {e}")
+        return cached[0] if cached else []
+    with quota_cache_lock:
+        quota_cache = (quotas, time.monotonic())
+    return quotas
+
+def quota_for(path):
+    """The quota whose folder holds `path`, with its current usage, or None."""
+    path = os.path.abspath(path)
+    for quota in get_quotas():
+        folder_path = os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], quota['folder']))
+        if os.path.commonpath([folder_path, path]) == folder_path:
+            usage = folder_usage.get(folder_path)
+            return dict(quota, used_bytes=usage['bytes'] if usage else 0)
+    return None
+
+def quota_error(destination, incoming_bytes, source=None):
+    """Message if adding `incoming_bytes` at `destination` would go over a quota, else None."""
+    quota = quota_for(destination)
+    if quota is None or incoming_bytes <= 0:
+        return None
+    if source is not None:
+        # Moving inside the quota folder does not change its usage
+        source_quota = quota_for(source)
+        if source_quota and source_quota['user_id'] == quota['user_id']:
+            return None
+    if quota['used_bytes'] + incoming_bytes > quota['max_bytes']:
+        return (f"Quota of {quota['username']} exceeded: {quota['used_bytes']} of "
+                f"{quota['max_bytes']} bytes used in {quota['folder']}")
+    return None
+
+def save_upload(file, file_path):
+    """Writes an uploaded file next to its destination and renames it into place."""
+    # Never write into an existing file: it may be a hardlink shared with other folders
+    if blob_store:
+        blob_store.save_stream(file.stream, file_path)
+        return
+    temporary = file_path + '.uploading'
+    file.save(temporary)
+    os.replace(temporary, file_path)
+
+def file_manager_path(*parts):
+    """Path below UPLOAD_FOLDER for a file manager entry, None for the root, internal folders or outside paths."""
+    path = os.path.normpath(os.path.join(app.config['UPLOAD_FOLDER'], *parts))
+    relative_path = os.path.relpath(path, app.config['UPLOAD_FOLDER'])
+    if relative_path in ('.', 'root') or not is_inside_upload_folder(path):
+        return None
+    if any(part in INTERNAL_FOLDERS for part in relative_path.split(os.sep)):
+        return None
+    return path
 
-def check_webui_is_installed(host='127.0.0.1', port=8080):
-    """Verifica se a porta está aberta no host especificado."""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(2)  # Define um tempo limite para a conexão
-        try:
-            s.connect((host, port))
-            return True
-        except (socket.timeout, ConnectionRefusedError):
-            return False
+def check_docker_installed():
+    """Reads the cached Engine state, no docker CLI is forked per request."""
+    return dockers.engine.installed()
+
+def get_local_ip():
+    """LAN address from the cached host facts, works without Internet access."""
+    return host_info.local_ip
+
+def check_webui_is_installed():
+    """Cached result of the background probe on the Open WebUI port."""
+    return service_health.is_up('open-webui')
         
-def check_ollama_is_installed(host='127.0.0.1', port=11434):
-    """Verifica se a porta está aberta no host especificado."""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(2)  # Define um tempo limite para a conexão
-        try:
-            s.connect((host, port))
-            return True
-        except (socket.timeout, ConnectionRefusedError):
-            return False
+def check_ollama_is_installed():
+    """Cached result of the background probe on the Ollama port."""
+    return service_health.is_up('ollama')
 
 def get_cpu_usage():
+    """Reads the latest background sample instead of blocking on psutil."""
     try:
-        cpu_usage = psutil.cpu_percent(interval=1)  
-        return round(cpu_usage, 2)
+        sample = metrics_sampler.latest()
+        if sample:
+            return sample['cpu']
+        return round(psutil.cpu_percent(interval=None), 2)
     except Exception as e:
         return "Error: " + str(e)
 
 def get_ram_usage():
     try:
-        if platform.system() == "Windows":
-            ram_usage = psutil.virtual_memory()[2]
-            return ram_usage
-        else:
-            output = subprocess.getoutput("free -m | grep Mem")
-            tokens = output.split()
-            ram_total = int(tokens[1])
-            ram_used = int(tokens[2])
-            ram_usage = (ram_used / ram_total) * 100
-            return round(ram_usage, 2)
+        if host_collector:
+            return host_collector.memory()['percent']
+        ram_usage = psutil.virtual_memory()[2]
+        return ram_usage
     except Exception as e:
         return "Error: " + str(e)
 
 def get_wifi_signal():
     try:
-        if platform.system() == "Windows":
-            output = subprocess.getoutput("netsh wlan show interfaces")
+        if host_collector:
+            return host_collector.wifi_signal()
+        if host_info.system == "Windows":
+            with metrics.timed('subprocess', metrics.subprocess_seconds, program='netsh'):
+                output = subprocess.getoutput("netsh wlan show interfaces")
             for line in output.splitlines():
                 if "Signal" in line:
                     signal_level = line.split(":")[1].strip().replace("%", "")
                     return int(signal_level)
-        elif platform.system == "linux":
-            output = subprocess.getoutput("nmcli -f SSID,SIGNAL dev wifi")
-            for line in output.splitlines():
-                if "*" in line:
-                    parts = line.split()
-                    if len(parts) > 1:
-                        signal_level = parts[1].replace('%', '')
-                        return int(signal_level)
     except Exception as e:
         return "Error: " + str(e)
 
+def get_network_rates():
+    """RX/TX bytes per second over every interface but loopback, as of the latest background sample."""
+    sample = metrics_sampler.latest()
+    interfaces = sample['net'] if sample else {}
+    return {
+        'rx': sum(rates['rx'] for name, rates in interfaces.items() if name != 'lo'),
+        'tx': sum(rates['tx'] for name, rates in interfaces.items() if name != 'lo'),
+    }
+
 def get_device_info():
     user_agent = request.headers.get('User-Agent')
     ip_address = request.remote_addr
-    os_name = platform.system()
+    os_name = host_info.system
     return ip_address, os_name, user_agent
 
 # Routes
@@ -302,13 +522,27 @@ def dashboard():
     cpu_usage = get_cpu_usage()
     ram_usage = get_ram_usage()
     wifi_signal = get_wifi_signal()
+    network_rates = get_network_rates()
 
     return render_template('dashboard.html',
+                           disk=host_info.disk_for(app.config['UPLOAD_FOLDER']),
+                           disks=host_info.disks,
                            wallpaper=wallpaper,
+                           wallpaper_variants=wallpaper_assets.variants(os.path.basename(wallpaper)) if wallpaper else [],
                            theme=theme,
                            cpu_usage=cpu_usage,
                            ram_usage=ram_usage,
-                           wifi_signal=wifi_signal)
+                           wifi_signal=wifi_signal,
+                           network_rates=network_rates)
+
+@app.route('/usage_history')
+def usage_history():
+    """Returns the sampled CPU/RAM/network history of the last N minutes for the sparklines."""
+    minutes = request.args.get('minutes', 10, type=float)
+    return jsonify({
+        'interval': metrics_sampler.interval,
+        'samples': metrics_sampler.history(seconds=minutes * 60)
+    })
 
 @app.route('/files/', defaults={'folder': 'root'})
 @app.route('/files/<path:folder>', methods=['GET', 'POST'])
@@ -327,7 +561,12 @@ def files(folder):
             if file and allowed_file(file.filename):
                 filename = secure_filename(file.filename)
                 file_path = os.path.join(current_folder, filename)
-                file.save(file_path)
+                error = quota_error(file_path, request.content_length or 0)
+                if error:
+                    flash(error, 'danger')
+                    return redirect(url_for('files', folder=folder))
+                save_upload(file, file_path)
+                record_path(file_path)
                 flash('File uploaded successfully', 'success')
             else:
                 flash('File type not allowed', 'danger')
@@ -339,6 +578,7 @@ def files(folder):
                 new_folder_path = os.path.join(current_folder, new_folder)
                 if not os.path.exists(new_folder_path):
                     os.makedirs(new_folder_path)
+                    record_path(new_folder_path)
                     flash('Folder created successfully', 'success')
                 else:
                     flash('Folder already exists', 'danger')
@@ -348,7 +588,11 @@ def files(folder):
         return redirect(url_for('files', folder=folder))
 
     # Obtenha arquivos e pastas na pasta atual
-    files, folders = list_files_and_folders(current_folder)
+    sort = request.args.get('sort', 'name')
+    order = request.args.get('order', 'asc')
+    files, folders, next_cursor = list_files_and_folders(current_folder, sort=sort, order=order)
+    # Kept up to date incrementally, no walk of the subfolders here
+    folder_totals = {entry['name']: folder_usage.get(os.path.join(current_folder, entry['name'])) for entry in folders}
 
     # Diretório pai
     parent_folder = None if folder == "" else os.path.dirname(folder)
@@ -357,25 +601,181 @@ def files(folder):
                            current_folder=folder,
                            files=files,
                            folders=folders,
-                           parent_folder=parent_folder)
+                           parent_folder=parent_folder,
+                           sort=sort,
+                           order=order,
+                           next_cursor=next_cursor,
+                           folder_totals=folder_totals,
+                           folder_total=folder_usage.get(current_folder),
+                           quota=quota_for(current_folder),
+                           thumbnails_enabled=thumbnail_cache.available(),
+                           image_extensions=sorted(thumbnails.IMAGE_EXTENSIONS))
+
+@app.route('/files_json/<path:folder>', methods=['GET'])
+def files_json(folder):
+    """One page of a folder listing, for lazy loading in the file manager."""
+    current_folder = os.path.join(app.config['UPLOAD_FOLDER'], folder)
+    if not os.path.isdir(current_folder) or not is_inside_upload_folder(current_folder):
+        return jsonify({'error': 'Folder not found'}), 404
+    try:
+        page = listing_cache.page(current_folder,
+                                  sort=request.args.get('sort', 'name'),
+                                  order=request.args.get('order', 'asc'),
+                                  cursor=request.args.get('cursor'),
+                                  limit=min(request.args.get('limit', FILES_PAGE_SIZE, type=int), 1000))
+    except file_listing.ListingError as e:
+        return jsonify({'error': str(e)}), 400
+    # The listing cache owns the entries, add folder totals to copies
+    page = dict(page, entries=[dict(entry, total=folder_usage.get(os.path.join(current_folder, entry['name'])))
+                               if entry['is_dir'] else entry for entry in page['entries']])
+    return jsonify(page)
+
+@app.route('/upload_session', methods=['POST'])
+def create_upload_session():
+    """Starts a resumable upload, the client then PUTs chunks at the returned offset."""
+    data = request.get_json(silent=True) or request.form
+    folder = data.get('folder', 'root')
+    filename = secure_filename(data.get('filename', ''))
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Missing file size'}), 400
+    destination = os.path.join(app.config['UPLOAD_FOLDER'], folder, filename)
+    if not is_inside_upload_folder(destination):
+        return jsonify({'error': 'Invalid folder'}), 400
+    error = quota_error(destination, size)
+    if error:
+        return jsonify({'error': error}), 400
+
+    upload_manager.purge_expired()
+    try:
+        return jsonify(upload_manager.create(destination, size)), 201
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/upload_session/<upload_id>', methods=['GET'])
+def upload_session_status(upload_id):
+    try:
+        return jsonify(upload_manager.status(upload_id))
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 404
+
+@app.route('/upload_session/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    offset = request.args.get('offset', type=int)
+    length = request.content_length
+    if offset is None or length is None:
+        return jsonify({'error': 'Missing offset or Content-Length'}), 400
+    try:
+        return jsonify(upload_manager.write_chunk(upload_id, offset, request.stream, length))
+    except chunked_upload.UploadError as e:
+        # 409 tells the client to ask for the current offset and resume from there
+        return jsonify({'error': str(e)}), 409
+
+@app.route('/upload_session/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    data = request.get_json(silent=True) or request.form
+    try:
+        result = upload_manager.complete(upload_id, checksum=data.get('checksum'))
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 409
+    if blob_store:
+        # The chunks were hashed as they arrived, linking is all that is left
+        try:
+            blob_store.link(result['destination'], result['sha256'])
+        except OSError as e:
+            print(f"Erro ao deduplicar {result['destination']}: {e}")
+    record_path(result['destination'])
+    return jsonify({'filename': os.path.basename(result['destination']),
+                    'sha256': result['sha256'],
+                    'size': result['size']})
+
+@app.route('/upload_session/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    try:
+        upload_manager.abort(upload_id)
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'aborted': True})
+
+@app.route('/search', methods=['GET'])
+def search_files():
+    """Filename search over everything under UPLOAD_FOLDER."""
+    query = request.args.get('q', '')
+    mode = 'prefix' if request.args.get('mode') == 'prefix' else 'substring'
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    results = file_index.search(query, mode=mode, extension=request.args.get('ext'), limit=limit)
+    for result in results:
+        folder, _, name = result['path'].rpartition('/')
+        result['folder'] = folder
+    return jsonify({'results': results, 'indexing': not file_index.ready.is_set()})
 
 @app.route('/download/<path:filename>', methods=['GET'])
 def download_file(filename):
     folder = request.args.get('folder', '')
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], folder, filename)
-    if os.path.exists(file_path):
-        return send_from_directory(os.path.dirname(file_path), filename, as_attachment=True)
+    # None outside UPLOAD_FOLDER and inside the server's own folders
+    file_path = file_manager_path(folder, filename)
+    if file_path and os.path.isfile(file_path):
+        # conditional=True answers Range, If-None-Match and If-Modified-Since requests;
+        # the file object goes to wsgi.file_wrapper, which the server can sendfile()
+        return send_from_directory(os.path.dirname(file_path), os.path.basename(file_path),
+                                   as_attachment=True, conditional=True, etag=True, max_age=0)
     else:
         flash('File not found', 'danger')
         return redirect(url_for('files', folder=folder))
 
+@app.route('/thumbnail/<path:filename>', methods=['GET'])
+def thumbnail(filename):
+    """Small JPEG preview of an image under UPLOAD_FOLDER, built on first request."""
+    folder = request.args.get('folder', '')
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], folder, filename)
+    if not os.path.isfile(file_path) or not is_inside_upload_folder(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    try:
+        thumbnail_path = thumbnail_cache.get(file_path)
+    except thumbnails.ThumbnailTimeout as e:
+        return jsonify({'error': str(e)}), 503
+    except thumbnails.ThumbnailError as e:
+        return jsonify({'error': str(e)}), 404
+    # The listing adds ?v=<mtime>, so that URL changes whenever the file does
+    response = send_file(thumbnail_path, mimetype='image/jpeg', conditional=True,
+                         max_age=31536000 if request.args.get('v') else 0)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@app.route('/download_folder/<path:folder>', methods=['GET'])
+def download_folder(folder):
+    """Streams a whole folder as a zip (default) or tar archive without temp files."""
+    archive_format = request.args.get('format', 'zip')
+    folder_path = os.path.join(app.config['UPLOAD_FOLDER'], folder)
+    internal = any(part in INTERNAL_FOLDERS for part in os.path.normpath(folder).split(os.sep))
+    if not os.path.isdir(folder_path) or not is_inside_upload_folder(folder_path) or internal:
+        flash('Folder not found', 'danger')
+        return redirect(url_for('files'))
+
+    if archive_format == 'tar':
+        generator, mimetype = archive_stream.stream_tar(folder_path, excluded=INTERNAL_FOLDERS), 'application/x-tar'
+    else:
+        archive_format = 'zip'
+        generator, mimetype = archive_stream.stream_zip(folder_path, excluded=INTERNAL_FOLDERS), 'application/zip'
+    archive_name = secure_filename(os.path.basename(os.path.normpath(folder_path))) or 'folder'
+    return Response(stream_with_context(generator),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{archive_name}.{archive_format}"'})
+
 
 @app.route('/delete/<path:filename>', methods=['POST'])
 def delete_file(filename):
     folder = request.form['folder']
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], folder, filename)
-    if os.path.isfile(file_path):
-        os.remove(file_path)
+    file_path = file_manager_path(folder, filename)
+    if file_path and os.path.isfile(file_path):
+        # Into the trash with one rename, the data is purged in the background
+        job = file_operations.trash(file_path)
+        if job is not None:
+            return redirect(url_for('job_page', job_id=job.id, next=url_for('files', folder=folder)))
         flash('File deleted successfully', 'success')
     else:
         flash('File not found', 'danger')
@@ -384,10 +784,12 @@ def delete_file(filename):
 @app.route('/delete_folder', methods=['POST'])
 def delete_folder():
     folder_to_delete = request.form['folder']
-    folder_path = os.path.join(app.config['UPLOAD_FOLDER'], folder_to_delete)
-    if os.path.isdir(folder_path):
+    folder_path = file_manager_path(folder_to_delete)
+    if folder_path and os.path.isdir(folder_path):
         try:
-            shutil.rmtree(folder_path)  # Remove a pasta e seu conteúdo
+            job = file_operations.trash(folder_path)
+            if job is not None:
+                return redirect(url_for('job_page', job_id=job.id, next=url_for('files')))
             flash('Folder deleted successfully', 'success')
         except Exception as e:
             flash(f'Error deleting folder: {str(e)}', 'danger')
@@ -395,6 +797,53 @@ def delete_folder():
         flash('Folder not found', 'danger')
     return redirect(url_for('files'))
 
+@app.route('/move', methods=['POST'])
+def move_entry():
+    """Moves or renames a file or folder; only moves across filesystems become a job."""
+    folder = request.form['folder']
+    name = request.form['name']
+    destination_folder = request.form.get('destination') or folder
+    source = file_manager_path(folder, name)
+    destination = file_manager_path(destination_folder, request.form.get('new_name') or name)
+    if not source or not destination:
+        flash('Invalid path', 'danger')
+        return redirect(url_for('files', folder=folder))
+    error = quota_error(destination, entry_size(source), source=source)
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('files', folder=folder))
+    try:
+        job = file_operations.move(source, destination)
+    except (file_ops.FileOpError, jobs.QueueFull) as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('files', folder=folder))
+    if job is not None:
+        return redirect(url_for('job_page', job_id=job.id, next=url_for('files', folder=destination_folder)))
+    flash('Moved successfully', 'success')
+    return redirect(url_for('files', folder=folder))
+
+@app.route('/copy', methods=['POST'])
+def copy_entry():
+    """Copies a file or folder in the background and shows the job's progress."""
+    folder = request.form['folder']
+    name = request.form['name']
+    destination_folder = request.form.get('destination') or folder
+    source = file_manager_path(folder, name)
+    destination = file_manager_path(destination_folder, request.form.get('new_name') or name)
+    if not source or not destination:
+        flash('Invalid path', 'danger')
+        return redirect(url_for('files', folder=folder))
+    error = quota_error(destination, entry_size(source))
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('files', folder=folder))
+    try:
+        job = file_operations.copy(source, destination)
+    except (file_ops.FileOpError, jobs.QueueFull) as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('files', folder=folder))
+    return redirect(url_for('job_page', job_id=job.id, next=url_for('files', folder=destination_folder)))
+
 @app.route('/create_folder', methods=['POST'])
 def create_folder_route():
     folder = request.form['folder']
@@ -402,6 +851,7 @@ def create_folder_route():
     new_folder_path = os.path.join(app.config['UPLOAD_FOLDER'], folder, new_folder)
     if not os.path.exists(new_folder_path):
         os.makedirs(new_folder_path)
+        record_path(new_folder_path)
         flash('Folder created successfully', 'success')
     else:
         flash('Folder already exists', 'danger')
@@ -420,6 +870,60 @@ def method_not_allowed(e):
     # Caso contrário, delegar ao manipulador global ou retornar uma resposta padrão
     return "Method Not Allowed", 405
     
+@app.route('/storage')
+def storage_page():
+    report = blob_store.report() if blob_store else None
+    quotas = []
+    for quota in get_quotas():
+        usage = folder_usage.get(os.path.join(app.config['UPLOAD_FOLDER'], quota['folder']))
+        quotas.append(dict(quota, used_bytes=usage['bytes'] if usage else 0))
+    uploads = folder_usage.get(app.config['UPLOAD_FOLDER'])
+    if request.args.get('format') == 'json':
+        return jsonify({'dedup': report, 'disks': host_info.disks, 'uploads': uploads, 'quotas': quotas})
+    return render_template('storage.html', dedup=report, disks=host_info.disks, uploads=uploads, quotas=quotas)
+
+@app.route('/storage/quota', methods=['POST'])
+def set_quota():
+    user = store.get_user_by_username(request.form.get('username', '').strip())
+    folder = request.form.get('folder', '').strip().strip('/')
+    try:
+        max_bytes = int(float(request.form['max_gb']) * 1000 ** 3)
+    except (KeyError, ValueError):
+        max_bytes = 0
+    if user is None:
+        flash('User not found', 'danger')
+    elif not folder or file_manager_path(folder) is None:
+        flash('Invalid folder', 'danger')
+    elif max_bytes <= 0:
+        flash('Invalid quota', 'danger')
+    else:
+        store.set_quota(user['id'], folder, max_bytes)
+        invalidate_quota_cache()
+        flash('Quota saved', 'success')
+    return redirect(url_for('storage_page'))
+
+@app.route('/storage/quota/<int:user_id>/delete', methods=['POST'])
+def delete_quota(user_id):
+    store.delete_quota(user_id)
+    invalidate_quota_cache()
+    flash('Quota removed', 'success')
+    return redirect(url_for('storage_page'))
+
+@app.route('/storage/dedup_scan', methods=['POST'])
+def dedup_scan():
+    """Deduplicates the existing files now, as a job with progress."""
+    if not blob_store:
+        flash('Deduplication is not enabled (DEDUP_ENABLED)', 'danger')
+        return redirect(url_for('storage_page'))
+    job = file_jobs.find_active('Deduplicate uploads')
+    if job is None:
+        try:
+            job = file_jobs.submit('Deduplicate uploads', blob_store.scan)
+        except jobs.QueueFull as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('storage_page'))
+    return redirect(url_for('job_page', job_id=job.id, next=url_for('storage_page')))
+
 @app.route('/setwt', methods=['GET', 'POST'])
 def set_wallpaper_and_theme():
     if request.method == 'POST':
@@ -429,10 +933,11 @@ def set_wallpaper_and_theme():
 
         apply_wallpaper_and_theme(user_id, wallpaper_path, theme)
         flash('Wallpaper and theme updated successfully!', 'success')
-    availble_wallpapers = os.listdir("static/wallpapers/")
+    availble_wallpapers = wallpaper_assets.sources()
     selected_wallpaper_path, selected_theme = get_selected_wallpaper_and_theme(session['user_id'])
     return render_template('setwt.html', 
                            availble_wallpapers=availble_wallpapers,
+                           thumbnails={name: wallpaper_assets.thumbnail(name) for name in availble_wallpapers},
                            selected_wallpaper_path=selected_wallpaper_path, 
                            selected_theme=selected_theme)
     
@@ -451,22 +956,56 @@ def upload_wallpaper():
         
         if file and (os.path.splitext(file.filename)[1].lower() in ALLOWED_EXTENSIONS):
             filename = secure_filename(file.filename)
-            file_path = os.path.join("static/wallpapers/", filename)
+            file_path = os.path.join(WALLPAPER_FOLDER, filename)
             file.save(file_path)
+            # Variants and thumbnail are built in the background
+            wallpaper_assets.add(filename)
             
             flash('Wallpaper successfully uploaded', 'success')
         else:
             flash('File type not allowed', 'danger')
             return redirect(request.url)
     
-    return render_template('setwt.html')
+    return redirect(url_for('set_wallpaper_and_theme'))
 
 @app.route('/user_management', methods=['GET', 'POST'])
 def user_management():
-    users = get_all_users()
-    if users is None:
-        users = []
-    return render_template('user_management.html', users=users)
+    users, next_after = search_users()
+    return render_template('user_management.html', users=users, next_after=next_after)
+
+@app.route('/users_json', methods=['GET'])
+def users_json():
+    """One page of the user directory, for search and lazy loading in user management."""
+    users, next_after = search_users(request.args.get('q', '').strip(),
+                                     after=request.args.get('after'),
+                                     substring=request.args.get('match') == 'contains',
+                                     limit=max(1, min(request.args.get('limit', USERS_PAGE_SIZE, type=int), 500)))
+    return jsonify({'users': users, 'next_after': next_after})
+
+@app.route('/access_history')
+def access_history():
+    user_id = request.args.get('user_id', type=int)
+    since = request.args.get('since') or None
+    until = request.args.get('until') or None
+    before = None
+    if request.args.get('before_time') and request.args.get('before_id', type=int):
+        before = (request.args['before_time'], request.args.get('before_id', type=int))
+    try:
+        rows, next_before = get_access_history(user_id=user_id, since=since, until=until, before=before)
+    except ValueError:
+        if request.args.get('format') == 'json':
+            return jsonify({'error': 'Invalid date'}), 400
+        flash('Invalid date', 'danger')
+        rows, next_before = [], None
+    if request.args.get('format') == 'json':
+        return jsonify({'rows': rows, 'next_before': next_before})
+    return render_template('access_history.html',
+                           rows=rows,
+                           next_before=next_before,
+                           users=get_all_users(),
+                           user_id=user_id,
+                           since=since or '',
+                           until=until or '')
 
 @app.route('/delete_user/<int:user_id>', methods=['POST'])
 def delete_user_route(user_id):
@@ -480,16 +1019,22 @@ def delete_user_route(user_id):
 @app.route('/update_password/<int:user_id>', methods=['POST'])
 def update_password_route(user_id):
     new_password = request.form['new_password']
-    update_user_password(user_id, new_password)
-    flash('Password updated successfully!', 'success')
+    try:
+        update_user_password(user_id, new_password)
+        flash('Password updated successfully!', 'success')
+    except passwords.HasherBusy as e:
+        flash(str(e), 'danger')
     return redirect(url_for('user_management'))
 
 @app.route('/create_user', methods=['POST'])
 def create_user_route():
     username = request.form['username']
     password = request.form['password']
-    create_user(username, password)
-    flash('User created successfully!', 'success')
+    try:
+        create_user(username, password)
+        flash('User created successfully!', 'success')
+    except passwords.HasherBusy as e:
+        flash(str(e), 'danger')
     return redirect(url_for('user_management'))
 
 @app.route('/settings', methods=['GET', 'POST'])
@@ -507,24 +1052,105 @@ def prompt():
     user_id = session.get('user_id', None)
     if not user_id:
         return redirect(url_for('login'))
-    if platform.system() == "Windows":
-        userhostfile = os.getcwd() + " $ "
-    else:
-        userhostfile = getpass.getuser() + "@" + socket.gethostname() + ":/" + os.path.basename(os.getcwd()) + "$ "
+    userhostfile = host_info.prompt_prefix
+    if terminal.pty_available():
+        return render_template('prompt.html', userhostfile=userhostfile, interactive=True,
+                               xterm_vendored=vendor_assets.vendored())
+
+    # Sem PTY (Windows): um comando por vez, com limite de tempo e de saída
     if request.method == 'POST':
         command = request.form['command']
         try:
-            result = subprocess.run(command.split(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output = result.stdout.decode("utf-8") + result.stderr.decode("utf-8")
+            with metrics.timed('subprocess', metrics.subprocess_seconds, program=metrics.program_name(command)):
+                result = subprocess.run(command.split(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                        timeout=PROMPT_TIMEOUT)
+            output = result.stdout[:PROMPT_MAX_OUTPUT].decode("utf-8", errors="replace")
+        except subprocess.TimeoutExpired:
+            output = f"Command timed out after {PROMPT_TIMEOUT:g}s"
         except Exception as e:
             output = str(e)
 
         return render_template('prompt.html',
                                userhostfile=userhostfile,
-                               output=output)
+                               output=output,
+                               interactive=False)
     return render_template('prompt.html',
                            userhostfile=userhostfile,
-                           output="")
+                           output="",
+                           interactive=False)
+
+def get_terminal(terminal_id):
+    return terminals.get(terminal_id, session.get('user_id'))
+
+@app.route('/terminal', methods=['POST'])
+def create_terminal():
+    try:
+        term = terminals.create(session.get('user_id'))
+    except terminal.SessionLimit as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify({'id': term.id}), 201
+
+@app.route('/terminal/<terminal_id>/stream')
+def terminal_stream(terminal_id):
+    """Server-sent events with the PTY output, base64 encoded, resumable via Last-Event-ID."""
+    term = get_terminal(terminal_id)
+    if term is None:
+        return jsonify({'error': 'Terminal not found'}), 404
+    if request.method == 'HEAD':
+        # Lets a tab check that its session still exists without taking a stream
+        return '', 200
+    offset = request.headers.get('Last-Event-ID', type=int)
+    if offset is None:
+        offset = request.args.get('offset', 0, type=int)
+    owner = session.get('user_id')
+    try:
+        token = terminals.open_stream(term, owner)
+    except terminal.StreamLimit as e:
+        return jsonify({'error': str(e)}), 429
+
+    def generate(offset):
+        while True:
+            data, offset = term.read(offset, timeout=15, token=token)
+            if term.superseded(token):
+                # The same terminal reconnected, free this thread
+                return
+            term.touch()
+            if data:
+                yield f"id: {offset}\ndata: {base64.b64encode(data).decode('ascii')}\n\n"
+            elif term.closed:
+                yield f"event: exit\ndata: {term.exit_code}\n\n"
+                return
+            else:
+                yield ": keep-alive\n\n"
+
+    response = Response(generate(offset), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: terminals.close_stream(term, token))
+    return response
+
+@app.route('/terminal/<terminal_id>/input', methods=['POST'])
+def terminal_input(terminal_id):
+    term = get_terminal(terminal_id)
+    if term is None:
+        return jsonify({'error': 'Terminal not found'}), 404
+    term.write(request.get_data())
+    return '', 204
+
+@app.route('/terminal/<terminal_id>/resize', methods=['POST'])
+def terminal_resize(terminal_id):
+    term = get_terminal(terminal_id)
+    if term is None:
+        return jsonify({'error': 'Terminal not found'}), 404
+    data = request.get_json(silent=True) or {}
+    term.resize(int(data.get('rows', 24)), int(data.get('cols', 80)))
+    return '', 204
+
+@app.route('/terminal/<terminal_id>', methods=['DELETE'])
+def close_terminal(terminal_id):
+    if get_terminal(terminal_id) is None:
+        return jsonify({'error': 'Terminal not found'}), 404
+    terminals.close(terminal_id)
+    return '', 204
 
 
 
@@ -534,14 +1160,77 @@ def prompt():
 
 # Apps
 
+def submit_job(name, function, *args, next_url=None):
+    """Queues an install, or re-attaches to the one already running under that name."""
+    job = job_runner.find_active(name)
+    if job is None:
+        try:
+            job = job_runner.submit(name, function, *args)
+        except jobs.QueueFull as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('apps'))
+    return redirect(url_for('job_page', job_id=job.id, next=next_url))
+
+def install_docker_job(job, password):
+    job.set_step('Installing Docker')
+    dockers.install_docker_linux(password, on_output=job.log)
+    job.log('Docker instalado com sucesso!')
+
+def install_pihole_job(job, password):
+    job.set_step('Running the Pi-hole container')
+    dockers.run_pihole_container(password, on_output=job.log)
+
+    job.set_step('Registering Pi-hole')
+    if not dockers.container_exists('pihole', password):
+        raise Exception('O container do Pi-hole não foi criado')
+    store.set_container_installed('pihole')
+    job.log('Pi-hole instalado com sucesso!')
+
+def install_ollama_job(job, password):
+    global ollama_is_installed
+    job.set_step('Running the Ollama container')
+    dockers.run_ollama_container(password, on_output=job.log)
+    job.set_step('Running the Open WebUI container')
+    dockers.run_openwebui_container(password, on_output=job.log)
+    ollama_is_installed = True
+
+def start_ollama_job(job, password):
+    job.set_step('Starting the Ollama container')
+    dockers.start_ollama_container(password, on_output=job.log)
+
+def find_job(job_id):
+    return job_runner.get(job_id) or file_jobs.get(job_id)
+
+@app.route('/jobs/<job_id>')
+def job_page(job_id):
+    job = find_job(job_id)
+    if job is None:
+        flash('Job not found', 'danger')
+        return redirect(url_for('apps'))
+    next_url = request.args.get('next', '')
+    if not next_url.startswith('/') or next_url.startswith('//'):
+        next_url = None
+    return render_template('job.html', job=job.to_dict(), next_url=next_url)
+
+@app.route('/jobs/<job_id>/progress')
+def job_progress(job_id):
+    """Output lines after `since`, waiting up to `wait` seconds for new ones (long polling)."""
+    job = find_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    since = request.args.get('since', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    if wait > 0:
+        job.wait(since, timeout=wait)
+    return jsonify(job.to_dict(since=since))
+
 @app.route('/install_docker', methods=['GET', 'POST'])
 def install_docker():
     if request.method == 'POST':
-        system = platform.system().lower()
+        system = host_info.system_lower
         if system == "linux":
             password = request.form['password']
-            dockers.install_docker_linux(password)
-            flash('Docker instalado com sucesso!', 'success')
+            return submit_job('install_docker', install_docker_job, password, next_url=url_for('apps'))
         elif system == "windows":
             return render_template('indisponivel.html')
         else:
@@ -560,19 +1249,14 @@ def install_docker_app():
 """
 @app.route('/uninstall_container', methods=['POST'])
 def uninstall_container():
-    system = platform.system().lower()
+    system = host_info.system_lower
     if system == "linux":
         container_name = request.form['container_name']
         dockers.run_command(f"docker stop {container_name}")
         dockers.run_command(f"docker rm {container_name}")
         
         # Remove o container do banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM docker_containers WHERE name = %s", (container_name,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        store.delete_docker_container(container_name)
         
         flash(f'Container {container_name} desinstalado com sucesso!', 'success')
         return redirect(url_for('dashboard'))
@@ -584,7 +1268,7 @@ def uninstall_container():
         
 @app.route('/apps')
 def apps():
-    system = platform.system().lower()
+    system = host_info.system_lower
     if system == "windows":
         return render_template('indisponivel.html')
     
@@ -605,22 +1289,29 @@ def apps():
     return render_template('applications.html', docker_alert=docker_alert, docker_apps=docker_apps, non_docker_apps=non_docker_apps)
 
 def get_docker_applications():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT name, port, installed, icon FROM docker_containers")
-    containers = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    containers = store.list_docker_containers()
 
     apps = [
         {
-            'name': container[0],
-            'port': container[1],
-            'installed' : container[2],
-            'icon': container[3] if container[3] is not None else '/static/icons/default_app.png'
+            'name': container['name'],
+            'port': container['port'],
+            'installed' : container['installed'],
+            'status': None,
+            'icon': container['icon'] if container['icon'] is not None else '/static/icons/default_app.png'
         }
         for container in containers
     ]
+    for app_info in apps:
+        port = str(app_info['port']).split('/')[0]
+        if port.isdigit():
+            service_health.register(app_info['name'], int(port))
+        app_info['health'] = service_health.status(app_info['name'])
+    if dockers.engine.available:
+        # The Engine's view wins over the stored flag
+        for app_info in apps:
+            state = dockers.engine.get(app_info['name'])
+            app_info['installed'] = state is not None
+            app_info['status'] = state['status'] if state else None
     return apps
 
 def get_non_docker_applications():
@@ -630,9 +1321,18 @@ def get_non_docker_applications():
     ]
 
 
+@app.route('/host_facts')
+def host_facts_route():
+    return jsonify(host_info.to_dict())
+
+@app.route('/health')
+def health_status():
+    return jsonify(service_health.all())
+
+
 @app.route('/view')
 def view():
-    system = platform.system().lower()
+    system = host_info.system_lower
     if system == "linux":
         if check_docker_installed():
             docker_apps = get_docker_applications()
@@ -649,13 +1349,12 @@ def view():
 
 @app.route('/start_ollama', methods=['GET', 'POST'])
 def start_ollama():
-    system = platform.system().lower()
+    system = host_info.system_lower
     if system == "linux":
         if check_docker_installed():
             if request.method == 'POST':
                 passw = request.form['password']
-                dockers.start_ollama_container(passw)
-                return redirect(url_for('view'))
+                return submit_job('start_ollama', start_ollama_job, passw, next_url=url_for('view'))
             return render_template('start_ollama.html')
         else:
             return redirect(url_for('install_docker'))
@@ -664,16 +1363,12 @@ def start_ollama():
 
 @app.route('/install_ollama', methods=['POST'])
 def install_ollama():
-    global ollama_is_installed
-    system = platform.system().lower()
+    system = host_info.system_lower
     if system == "linux":
         if check_docker_installed():
             if request.method == 'POST':
                 passw = request.form['password']
-                dockers.run_ollama_container(passw)
-                dockers.run_openwebui_container(passw)
-                ollama_is_installed = True
-                return redirect(url_for('view'))
+                return submit_job('install_ollama', install_ollama_job, passw, next_url=url_for('view'))
             return render_template('install_ollama.html')
         else:
             return redirect(url_for('install_docker'))
@@ -686,19 +1381,8 @@ def install_pihole():
         # Obtém a senha do formulário
         passw = request.form['password']
         
-        # Adiciona o Pi-hole ao banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE docker_containers SET installed=TRUE WHERE name = 'pihole';")
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        # Executa o comando para rodar o container Pi-hole com a senha fornecida
-        dockers.run_pihole_container(passw)
-        
-        flash('Pi-hole instalado com sucesso!', 'success')
-        return redirect(url_for('view'))
+        # Roda o container Pi-hole em segundo plano e o registra no banco de dados no fim
+        return submit_job('install_pihole', install_pihole_job, passw, next_url=url_for('view'))
     
     # Renderiza o template com o formulário de instalação
     return render_template('install_pihole.html')
@@ -709,31 +1393,124 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        throttle_keys = ('ip:' + str(request.remote_addr), 'user:' + username.lower())
 
-        connection = get_db_connection()
         try:
-            with connection.cursor(dictionary=True) as cursor:
-                cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-                user = cursor.fetchone()
-                if user and bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
-                    session['logged_in'] = True
-                    session['user_id'] = user['id']
-
-                    log_user_access(user['id'], 'Login Successful')
-                    return redirect(url_for('dashboard'))
-                else:
-                    return render_template('login.html', error=True)
-        finally:
-            connection.close()
+            login_throttle.check(*throttle_keys)
+        except passwords.TooManyAttempts as e:
+            return render_template('login.html', error=True, message=str(e)), 429
+
+        user = store.get_user_by_username(username)
+
+        try:
+            valid = bool(user) and password_hasher.verify(password, user['password'])
+        except passwords.HasherBusy as e:
+            return render_template('login.html', error=True, message=str(e)), 503, {'Retry-After': '5'}
+
+        if not valid:
+            login_throttle.failed(*throttle_keys)
+            return render_template('login.html', error=True)
+
+        login_throttle.succeeded(*throttle_keys)
+        session['logged_in'] = True
+        session['user_id'] = user['id']
+
+        if password_hasher.needs_rehash(user['password']):
+            # Stored with a lower cost, upgrade it while we have the plain password
+            try:
+                update_user_password(user['id'], password)
+            except Exception as e:
+                print(f"Erro ao atualizar o hash da senha: {e}")
+
+        log_user_access(user['id'], 'Login Successful')
+        return redirect(url_for('dashboard'))
 
     return render_template('login.html')
 
+@app.route('/db_pool_stats')
+def db_pool_stats():
+    return jsonify(store.stats())
+
+@app.route('/metrics')
+def metrics_route():
+    """Request, SQL, subprocess and template timings of this process in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+def metrics_gauges():
+    gauges = {
+        'homefusion_access_log_dropped_total': ('Access events dropped because the queue was full.',
+                                                access_writer.stats['dropped']),
+    }
+    pool = store.stats()
+    if 'in_use' in pool:
+        gauges['homefusion_db_pool_open'] = ('Open database connections.', pool['open'])
+        gauges['homefusion_db_pool_in_use'] = ('Database connections checked out.', pool['in_use'])
+    return gauges
+
+metrics.registry.add_gauges(metrics_gauges)
+
+@app.before_request
+def start_request_timer():
+    metrics.begin_request()
+
+@app.after_request
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request(exception=None):
+    elapsed, phases = metrics.end_request()
+    endpoint = request.endpoint or 'not_found'
+    status = g.get('response_status', 500)
+    metrics.request_seconds.observe(elapsed, endpoint=endpoint, method=request.method)
+    metrics.requests_total.inc(endpoint=endpoint, method=request.method, status=status)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        print(f"Slow request: {request.method} {request.full_path.rstrip('?')} {status} "
+              f"{elapsed * 1000:.1f} ms ({metrics.describe_phases(elapsed, phases)})", flush=True)
+
+def template_started(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+def template_finished(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.template_seconds.observe(elapsed, template=template.name)
+        metrics.add_phase('template', elapsed)
+
+before_render_template.connect(template_started, app)
+template_rendered.connect(template_finished, app)
+
+@app.after_request
+def static_cache_headers(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        if request.path.startswith('/' + WALLPAPER_VARIANTS_FOLDER):
+            # The name changes whenever the content does
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}'
+    return response
+
+@app.before_request
+def ensure_background_services():
+    # No-op after the first request; covers servers that run no startup hook
+    if not services_started:
+        start_background_services()
+
 @app.before_request
 def check_login():
     public_endpoints = ['login']
+    if (request.endpoint == 'metrics_route' and METRICS_TOKEN
+            and hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + METRICS_TOKEN)):
+        return None
     if 'logged_in' not in session and request.endpoint not in public_endpoints:
         return redirect(url_for('login'))
 
 # Application Entry Point
 if __name__ == '__main__':
-    app.run(debug=True, host="0.0.0.0", port=9900)
+    # Development server only, production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes'),
+            host=os.environ.get('HOST', '0.0.0.0'),
+            port=int(os.environ.get('PORT', 9900)),
+            threaded=True)
@@ -0,0 +1,98 @@
+import os
+import tarfile
+import time
+import zipfile
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class StreamBuffer:
+    """Write-only file object that hands out whatever was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def walk_files(root, excluded=()):
+    """Yields (absolute path, archive name) for every file under root, sorted, skipping `excluded` folder names."""
+    base = os.path.basename(os.path.normpath(root))
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if name not in excluded)
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            arcname = os.path.join(base, os.path.relpath(path, root))
+            yield path, arcname
+
+
+def stream_zip(root, excluded=()):
+    """
+    Yields a ZIP archive of `root` piece by piece.
+
+    Entries are stored (not deflated) since most of what lives here is
+    already compressed media, and written with data descriptors so nothing
+    has to be seeked back to or buffered.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for path, arcname in walk_files(root, excluded):
+            try:
+                stat = os.stat(path)
+                info = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+                info.external_attr = (stat.st_mode & 0xFFFF) << 16
+                with open(path, 'rb') as source, archive.open(info, 'w', force_zip64=True) as entry:
+                    while True:
+                        block = source.read(READ_BLOCK_SIZE)
+                        if not block:
+                            break
+                        entry.write(block)
+                        yield buffer.drain()
+            except OSError:
+                # The file vanished or is unreadable, skip it rather than break the archive
+                continue
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def stream_tar(root, excluded=()):
+    """Yields an uncompressed TAR archive of `root` piece by piece."""
+    for path, arcname in walk_files(root, excluded):
+        try:
+            stat = os.stat(path)
+            source = open(path, 'rb')
+        except OSError:
+            continue
+        with source:
+            info = tarfile.TarInfo(arcname)
+            info.size = stat.st_size
+            info.mtime = stat.st_mtime
+            info.mode = stat.st_mode & 0o777
+            yield info.tobuf(format=tarfile.PAX_FORMAT)
+            remaining = info.size
+            while remaining > 0:
+                block = source.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    # Truncated while streaming, pad with zeros to keep the declared size
+                    block = b'\0' * min(READ_BLOCK_SIZE, remaining)
+                remaining -= len(block)
+                yield block
+            padding = -info.size % tarfile.BLOCKSIZE
+            if padding:
+                yield b'\0' * padding
+    yield b'\0' * (tarfile.BLOCKSIZE * 2)
@@ -0,0 +1,387 @@
+"""
+Route latency and throughput benchmark.
+
+Boots app.py on a local threaded server and drives its main routes with
+concurrent keep-alive clients, then reports p50/p95/p99 latency and
+requests per second per route. The database is a throwaway SQLite file
+(STORAGE_BACKEND=sqlite) and Docker and psutil are replaced by in-process
+fakes, so runs are repeatable on any machine; the fakes keep the
+real call semantics (psutil.cpu_percent(interval=1) still sleeps a second),
+so a blocking call slipping back into a request path shows up in the
+numbers. Results are written as JSON and can be compared with an earlier
+run:
+
+    python3 benchmark.py --clients 8 --duration 10
+    python3 benchmark.py --compare benchmark-results/20261018-101500.json
+
+Use --url to measure a server that is already running (real backends)
+instead; --username/--password are then needed to log in.
+"""
+import argparse
+import collections
+import datetime
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.parse
+
+ROUTES = [
+    # (name, method, path, body)
+    ('dashboard', 'GET', '/', None),
+    ('usage_history', 'GET', '/usage_history?minutes=5', None),
+    ('files', 'GET', '/files/', None),
+    ('files_json', 'GET', '/files_json/root?limit=200', None),
+    ('search', 'GET', '/search?q=report', None),
+    ('download', 'GET', '/download/sample.bin?folder=root', None),
+    ('apps', 'GET', '/apps', None),
+    ('user_search', 'GET', '/users_json?q=enc&match=contains', None),
+    ('login', 'POST', '/login', 'credentials'),
+]
+
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench-password'
+
+
+# Fakes
+
+def fake_psutil():
+    """Module with the psutil calls the app makes; interval= still blocks like the real one."""
+    module = types.ModuleType('psutil')
+    memory = collections.namedtuple('svmem', 'total available percent used free')
+    address = collections.namedtuple('snicaddr', 'family address netmask broadcast ptp')
+    stats = collections.namedtuple('snicstats', 'isup duplex speed mtu flags')
+    partition = collections.namedtuple('sdiskpart', 'device mountpoint fstype opts')
+    disk = collections.namedtuple('sdiskusage', 'total used free percent')
+
+    def cpu_percent(interval=None, percpu=False):
+        if interval:
+            time.sleep(interval)
+        return [12.5, 7.5, 20.0, 3.0] if percpu else 10.75
+
+    def virtual_memory():
+        return memory(8 << 30, 5 << 30, 37.5, 3 << 30, 2 << 30)
+
+    def net_if_addrs():
+        import socket
+        return {'lo': [address(socket.AF_INET, '127.0.0.1', '255.0.0.0', None, None)],
+                'eth0': [address(socket.AF_INET, '192.168.1.50', '255.255.255.0', None, None)]}
+
+    def net_if_stats():
+        return {'lo': stats(True, 0, 0, 65536, ''), 'eth0': stats(True, 2, 1000, 1500, '')}
+
+    def disk_partitions(all=False):
+        return [partition('/dev/sda1', '/', 'ext4', 'rw')]
+
+    def disk_usage(path):
+        return disk(500 << 30, 200 << 30, 300 << 30, 40.0)
+
+    module.disk_partitions = disk_partitions
+    module.disk_usage = disk_usage
+    module.cpu_percent = cpu_percent
+    module.virtual_memory = virtual_memory
+    module.net_if_addrs = net_if_addrs
+    module.net_if_stats = net_if_stats
+    return module
+
+
+def fake_docker():
+    """Importable docker SDK stand-in; the Engine table is filled in directly."""
+    module = types.ModuleType('docker')
+    errors = types.ModuleType('docker.errors')
+
+    class DockerException(Exception):
+        pass
+
+    class NotFound(DockerException):
+        pass
+
+    class ImageNotFound(NotFound):
+        pass
+
+    errors.DockerException = DockerException
+    errors.NotFound = NotFound
+    errors.ImageNotFound = ImageNotFound
+    module.errors = errors
+
+    def from_env(*args, **kwargs):
+        raise DockerException("The benchmark has no Docker daemon")
+
+    module.from_env = from_env
+    module.DockerClient = lambda *args, **kwargs: from_env()
+    return module
+
+
+def prepare_workdir(files):
+    """Temporary tree with an upload folder of `files` entries and a 1 MB download."""
+    workdir = tempfile.mkdtemp(prefix='homefusion-bench-')
+    root = os.path.join(workdir, 'uploads', 'root')
+    os.makedirs(root)
+    for i in range(files):
+        name = f"report-{i:05d}.txt" if i % 2 else f"notes-{i:05d}.md"
+        with open(os.path.join(root, name), 'w') as f:
+            f.write('x' * (i % 4096))
+    with open(os.path.join(root, 'sample.bin'), 'wb') as f:
+        f.write(os.urandom(1024 * 1024))
+    # Wallpapers and the other static files are read relative to the working directory
+    os.symlink(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'), os.path.join(workdir, 'static'))
+    return workdir
+
+
+def boot_app(args):
+    """Imports app.py against the fakes and serves it on a random local port."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, here)
+    workdir = prepare_workdir(args.files)
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['STORAGE_BACKEND'] = 'sqlite'
+    os.environ['SQLITE_PATH'] = os.path.join(workdir, 'homefusion.db')
+    os.environ['SEARCH_INDEX_PATH'] = os.path.join(workdir, 'search_index.db')
+    os.environ['THUMBNAIL_CACHE_FOLDER'] = os.path.join(workdir, 'thumbnail_cache')
+    # A fixed cost keeps /login comparable between machines
+    os.environ.setdefault('BCRYPT_COST', str(args.bcrypt_cost))
+    os.environ.setdefault('DOCKER_HOST', 'unix:///nonexistent.sock')
+    sys.modules['psutil'] = fake_psutil()
+    sys.modules['docker'] = fake_docker()
+    sys.modules['docker.errors'] = sys.modules['docker'].errors
+    os.chdir(workdir)
+
+    import app as homefusion
+    import dockers
+
+    # Docker Engine "connected" with a fixed container table, no events thread
+    dockers.engine.start = lambda: None
+    dockers.engine._connected.set()
+    dockers.engine.containers = {
+        'open-webui': {'id': 'a1', 'name': 'open-webui', 'image': 'open-webui', 'status': 'running', 'ports': {}},
+        'jellyfin': {'id': 'b2', 'name': 'jellyfin', 'image': 'jellyfin', 'status': 'exited', 'ports': {}},
+    }
+
+    homefusion.start_background_services()
+    homefusion.create_user(BENCH_USERNAME, BENCH_PASSWORD)
+    user = homefusion.store.get_user_by_username(BENCH_USERNAME)
+    homefusion.store.apply_wallpaper_and_theme(user['id'], 'sky.jpg', 'dark')
+    with homefusion.store.backend.connection() as connection:
+        # db.sql only seeds pihole
+        connection.executemany("INSERT INTO docker_containers (name, port, installed) VALUES (?, ?, 1)",
+                               [('open-webui', '8080'), ('jellyfin', '8096')])
+        connection.commit()
+    # Let the first samples and the search index land before measuring
+    homefusion.file_index.ready.wait(timeout=30)
+    time.sleep(homefusion.metrics_sampler.interval + 0.5)
+
+    from werkzeug.serving import make_server
+    # One log line per request would cost more than some of the routes
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, homefusion.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server, workdir
+
+
+# Load generation
+
+class Client:
+    """One keep-alive HTTP connection carrying the session cookie."""
+
+    def __init__(self, base_url, cookie=None, timeout=60):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.cookie = cookie
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            raise
+        return response
+
+    def close(self):
+        self.connection.close()
+
+
+def login(base_url, username, password):
+    client = Client(base_url)
+    body = urllib.parse.urlencode({'username': username, 'password': password})
+    response = client.request('POST', '/login', body,
+                              {'Content-Type': 'application/x-www-form-urlencoded'})
+    client.close()
+    cookie = response.getheader('Set-Cookie')
+    if response.status != 302 or not cookie:
+        raise SystemExit(f"Login as {username} failed (HTTP {response.status})")
+    return cookie.split(';', 1)[0]
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def to_ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def run_route(base_url, cookie, route, clients, duration, warmup, credentials):
+    name, method, path, body = route
+    headers = {}
+    if body == 'credentials':
+        body = urllib.parse.urlencode({'username': credentials[0], 'password': credentials[1]})
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    latencies = []
+    errors = collections.Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(clients + 1)
+
+    def worker():
+        client = Client(base_url, cookie)
+        for _ in range(warmup):
+            try:
+                client.request(method, path, body, headers)
+            except Exception:
+                pass
+        start.wait()
+        own = []
+        stop_at = time.perf_counter() + duration
+        while time.perf_counter() < stop_at:
+            began = time.perf_counter()
+            try:
+                response = client.request(method, path, body, headers)
+                status = response.status
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - began
+            # A GET redirected elsewhere (missing file, lost session) measured nothing
+            if isinstance(status, int) and (status < 300 or (method == 'POST' and status in (302, 303))):
+                own.append(elapsed)
+            else:
+                with lock:
+                    errors[str(status)] += 1
+        client.close()
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'method': method,
+        'path': path,
+        'requests': len(latencies),
+        'errors': dict(errors),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0,
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'mean_ms': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': to_ms(latencies[-1]) if latencies else None,
+    }
+
+
+# Reporting
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(results, baseline=None):
+    previous = (baseline or {}).get('routes', {})
+    print(f"{'route':<15}{'req':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results['routes'].items():
+        line = (f"{name:<15}{result['requests']:>8}{sum(result['errors'].values()):>6}"
+                f"{result['throughput_rps']:>10.1f}")
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            line += f"{result[key]:>10.2f}" if result[key] is not None else f"{'-':>10}"
+        before = previous.get(name)
+        if before and before.get('p95_ms') and result['p95_ms'] is not None:
+            change = (result['p95_ms'] - before['p95_ms']) * 100 / before['p95_ms']
+            line += f"   p95 {change:+.0f}% vs {baseline.get('revision') or 'baseline'}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route latency benchmark for HomeFusion")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent clients per route")
+    parser.add_argument('--duration', type=float, default=10, help="seconds per route")
+    parser.add_argument('--warmup', type=int, default=5, help="unmeasured requests per client first")
+    parser.add_argument('--routes', help="comma-separated route names (default: all)")
+    parser.add_argument('--files', type=int, default=2000, help="files in the benchmark folder")
+    parser.add_argument('--bcrypt-cost', type=int, default=10)
+    parser.add_argument('--url', help="benchmark a running server instead of booting one with fakes")
+    parser.add_argument('--username', default=BENCH_USERNAME)
+    parser.add_argument('--password', default=BENCH_PASSWORD)
+    parser.add_argument('--output', help="JSON file for the results (default: benchmark-results/<time>.json)")
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = os.path.abspath(args.output) if args.output else os.path.join(
+        here, 'benchmark-results', datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    selected = [route for route in ROUTES
+                if not args.routes or route[0] in re.split(r'\s*,\s*', args.routes)]
+    if args.url:
+        base_url = args.url
+    else:
+        base_url, server, workdir = boot_app(args)
+    cookie = login(base_url, args.username, args.password)
+
+    results = {
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': {'system': platform.system(), 'cpus': os.cpu_count()},
+        'target': args.url or 'in-process with fakes',
+        'config': {'clients': args.clients, 'duration': args.duration, 'warmup': args.warmup,
+                   'files': args.files, 'bcrypt_cost': args.bcrypt_cost},
+        'routes': {},
+    }
+    for route in selected:
+        print(f"{route[0]}: {args.clients} clients for {args.duration:g}s...", flush=True)
+        results['routes'][route[0]] = run_route(base_url, cookie, route, args.clients, args.duration,
+                                                args.warmup, (args.username, args.password))
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print()
+    print_report(results, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
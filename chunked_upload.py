@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Raised when a chunk or an upload session is rejected."""
+
+
+class ChunkedUploadManager:
+    """
+    Resumable uploads written chunk by chunk under a staging folder.
+
+    Each session keeps its metadata in `<staging>/<upload_id>/session.json`
+    and its bytes in `<staging>/<upload_id>/data.part`. Chunks must arrive at
+    the current offset, which lets the SHA-256 be computed while the data
+    streams in. A finished upload is moved into place with os.replace.
+
+    Args:
+        staging_folder (str): Where partial uploads are kept.
+        chunk_size (int): Largest chunk accepted in a single request.
+        expire_after (float): Seconds of inactivity before a session is purged.
+    """
+
+    def __init__(self, staging_folder, chunk_size=8 * 1024 * 1024, expire_after=24 * 3600):
+        self.staging_folder = staging_folder
+        self.chunk_size = chunk_size
+        self.expire_after = expire_after
+        self._hashers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(staging_folder, exist_ok=True)
+
+    def _session_dir(self, upload_id):
+        # upload_id comes from the client, only accept what create() hands out
+        try:
+            upload_id = uuid.UUID(upload_id).hex
+        except (ValueError, AttributeError, TypeError):
+            raise UploadError("Invalid upload id")
+        return os.path.join(self.staging_folder, upload_id)
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id):
+        path = os.path.join(self._session_dir(upload_id), 'session.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Upload session not found")
+
+    def _save(self, upload_id, session):
+        session_dir = self._session_dir(upload_id)
+        tmp_path = os.path.join(session_dir, 'session.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(tmp_path, os.path.join(session_dir, 'session.json'))
+
+    def _hasher(self, upload_id, session):
+        """Returns the running SHA-256 for the session, rebuilding it after a restart."""
+        hasher = self._hashers.get(upload_id)
+        if hasher and hasher[1] == session['offset']:
+            return hasher[0]
+        sha = hashlib.sha256()
+        with open(os.path.join(self._session_dir(upload_id), 'data.part'), 'rb') as f:
+            remaining = session['offset']
+            while remaining > 0:
+                block = f.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                sha.update(block)
+                remaining -= len(block)
+        self._hashers[upload_id] = (sha, session['offset'])
+        return sha
+
+    def create(self, destination, size):
+        """Starts a session that will end up at `destination`, returns its status."""
+        if size < 0:
+            raise UploadError("Invalid file size")
+        upload_id = uuid.uuid4().hex
+        session_dir = self._session_dir(upload_id)
+        os.makedirs(session_dir)
+        open(os.path.join(session_dir, 'data.part'), 'wb').close()
+        session = {
+            'upload_id': upload_id,
+            'destination': destination,
+            'size': size,
+            'offset': 0,
+            'created_at': time.time(),
+            'updated_at': time.time(),
+        }
+        self._save(upload_id, session)
+        self._hashers[upload_id] = (hashlib.sha256(), 0)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        session = self._load(upload_id)
+        return {
+            'upload_id': session['upload_id'],
+            'size': session['size'],
+            'offset': session['offset'],
+            'chunk_size': self.chunk_size,
+            'complete': session['offset'] >= session['size'],
+        }
+
+    def write_chunk(self, upload_id, offset, stream, length):
+        """
+        Writes `length` bytes read from `stream` at `offset`.
+
+        A chunk starting before the current offset is treated as a retry and
+        only its unseen tail is kept, so a client can resend after a timeout.
+        """
+        if length > self.chunk_size:
+            raise UploadError(f"Chunk larger than {self.chunk_size} bytes")
+        with self._session_lock(upload_id):
+            session = self._load(upload_id)
+            if offset > session['offset'] or offset < 0:
+                raise UploadError(f"Expected offset {session['offset']}")
+            if offset + length > session['size']:
+                raise UploadError("Chunk goes past the declared file size")
+            sha = self._hasher(upload_id, session)
+
+            skip = session['offset'] - offset
+            written = 0
+            with open(os.path.join(self._session_dir(upload_id), 'data.part'), 'r+b') as f:
+                f.seek(session['offset'])
+                remaining = length
+                while remaining > 0:
+                    block = stream.read(min(READ_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    if skip >= len(block):
+                        skip -= len(block)
+                        continue
+                    block = block[skip:]
+                    skip = 0
+                    f.write(block)
+                    sha.update(block)
+                    written += len(block)
+                f.flush()
+                os.fsync(f.fileno())
+
+            session['offset'] += written
+            session['updated_at'] = time.time()
+            self._save(upload_id, session)
+            self._hashers[upload_id] = (sha, session['offset'])
+            if remaining > 0:
+                raise UploadError("Connection closed before the chunk was complete")
+        return self.status(upload_id)
+
+    def complete(self, upload_id, checksum=None):
+        """Verifies size and checksum and moves the file to its destination."""
+        with self._session_lock(upload_id):
+            session = self._load(upload_id)
+            if session['offset'] != session['size']:
+                raise UploadError(f"Upload incomplete: {session['offset']} of {session['size']} bytes")
+            digest = self._hasher(upload_id, session).hexdigest()
+            if checksum and checksum.lower() != digest:
+                raise UploadError("Checksum mismatch")
+            destination = session['destination']
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(os.path.join(self._session_dir(upload_id), 'data.part'), destination)
+            self._discard(upload_id)
+        return {'destination': destination, 'sha256': digest, 'size': session['size']}
+
+    def abort(self, upload_id):
+        with self._session_lock(upload_id):
+            self._load(upload_id)
+            self._discard(upload_id)
+
+    def _discard(self, upload_id):
+        session_dir = self._session_dir(upload_id)
+        for name in os.listdir(session_dir):
+            os.remove(os.path.join(session_dir, name))
+        os.rmdir(session_dir)
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+
+    def purge_expired(self):
+        """Removes sessions that have not received a chunk in `expire_after` seconds."""
+        now = time.time()
+        for upload_id in os.listdir(self.staging_folder):
+            try:
+                session = self._load(upload_id)
+                if now - session['updated_at'] > self.expire_after:
+                    self.abort(upload_id)
+            except (UploadError, OSError, ValueError):
+                continue
@@ -1,7 +1,8 @@
 import bcrypt
-import mysql.connector
 import os
 import dotenv
+import passwords
+import storage
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -12,42 +13,32 @@ DB = os.getenv('DB')
 print(USER_DB)
 print(PASS_DB)
 
-# Function to hash a password
+BCRYPT_COST = os.getenv('BCRYPT_COST')
+BCRYPT_TARGET_MS = float(os.getenv('BCRYPT_TARGET_MS', 250))
+
+# Function to hash a password (same cost as the server, so it is not rehashed on first login)
 def hash_password(password):
-    salt = bcrypt.gensalt()
+    cost = int(BCRYPT_COST) if BCRYPT_COST else passwords.calibrate_cost(BCRYPT_TARGET_MS)
+    salt = bcrypt.gensalt(rounds=cost)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password.decode('utf-8')  # Decode bytes to string for storage
 
 def store_user(username, password):
+    # Same backend as the server (STORAGE_BACKEND / SQLITE_PATH)
+    store = storage.open_store(os.getenv('STORAGE_BACKEND', 'mysql').lower(),
+                               sqlite_path=os.getenv('SQLITE_PATH', 'homefusion.db'),
+                               pool_options={'size': 1},
+                               host=os.getenv('HOST_DB', 'localhost'),
+                               user=USER_DB,
+                               password=PASS_DB,
+                               database=DB)
     try:
-        # Connect to the database
-        conn = mysql.connector.connect(
-            host="localhost",
-            user=USER_DB,
-            password=PASS_DB,
-            database=DB
-        )
-        cursor = conn.cursor()
-        
-        # Hash the password
-        hashed_password = hash_password(password)
-        
-        # Insert the user into the database
-        query = "INSERT INTO users (username, password) VALUES (%s, %s)"
-        cursor.execute(query, (username, hashed_password))
-        
-        # Commit the transaction
-        conn.commit()
-        
+        store.create_user(username, hash_password(password))
         print("User stored successfully.")
-    
-    except mysql.connector.Error as err:
+    except Exception as err:
         print(f"Error: {err}")
-    
     finally:
-        # Close the cursor and connection
-        cursor.close()
-        conn.close()
+        store.close()
 
 # Prompt user for password and store user
 user = input("User:\t")
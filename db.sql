@@ -12,6 +12,24 @@ CREATE TABLE users (
 );
 
 
+-- Lowercase 3-character slices of each username, for substring search
+CREATE TABLE user_trigrams (
+    trigram VARCHAR(3) NOT NULL,
+    user_id INT NOT NULL,
+    PRIMARY KEY (trigram, user_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+
+-- Per-user storage limit on a folder under the upload folder (e.g. root/alice)
+CREATE TABLE user_quotas (
+    user_id INT PRIMARY KEY,
+    folder VARCHAR(255) NOT NULL,
+    max_bytes BIGINT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+
 CREATE TABLE access (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
@@ -20,7 +38,9 @@ CREATE TABLE access (
     os_name VARCHAR(50),
     user_agent TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    INDEX idx_access_user_created (user_id, created_at, id),
+    INDEX idx_access_created (created_at, id)
 );
 
 
@@ -30,7 +50,16 @@ CREATE TABLE wallpapers_and_theme_for_user (
     wallpaper_path VARCHAR(255),
     theme VARCHAR(50),
     applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id)
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    INDEX idx_wallpapers_user_applied (user_id, applied_at)
+);
+
+CREATE TABLE user_preferences (
+    user_id INT PRIMARY KEY,
+    wallpaper_path VARCHAR(255),
+    theme VARCHAR(50),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
 CREATE TABLE docker_containers (
@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+
+import mysql.connector
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class PooledConnection:
+    """Wraps a MySQL connection so that close() gives it back to the pool."""
+
+    def __init__(self, pool, connection, overflow=False):
+        self._pool = pool
+        self._connection = connection
+        self._overflow = overflow
+        self._closed = False
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._connection, self._overflow)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool of MySQL connections shared by every data-access helper.
+
+    Args:
+        size (int): Connections kept open between requests.
+        max_overflow (int): Extra connections opened under load and closed on release.
+        timeout (float): Seconds to wait for a free connection before giving up.
+        recycle (float): Connections idle longer than this are pinged before reuse.
+    """
+
+    def __init__(self, size=5, max_overflow=5, timeout=10, recycle=300, **connect_args):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self._connect_args = connect_args
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._overflow = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'failures': 0,
+            'health_check_failures': 0,
+            'opened': 0,
+            'closed': 0,
+        }
+
+    def _connect(self):
+        try:
+            connection = mysql.connector.connect(**self._connect_args)
+        except Exception:
+            with self._lock:
+                self._stats['failures'] += 1
+            raise
+        with self._lock:
+            self._stats['opened'] += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats['closed'] += 1
+
+    def _is_healthy(self, connection, idle_since):
+        if time.monotonic() - idle_since < self.recycle:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def _reserve_slot(self):
+        """Returns 'pool' or 'overflow' if a new connection may be opened, else None."""
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return 'pool'
+            if self._overflow < self.max_overflow:
+                self._overflow += 1
+                return 'overflow'
+        return None
+
+    def _free_slot(self, overflow):
+        with self._lock:
+            if overflow:
+                self._overflow -= 1
+            else:
+                self._opened -= 1
+
+    def _open_in_slot(self, slot):
+        try:
+            connection = self._connect()
+        except Exception:
+            self._free_slot(slot == 'overflow')
+            raise
+        return PooledConnection(self, connection, overflow=(slot == 'overflow'))
+
+    def get_connection(self):
+        with self._lock:
+            self._stats['checkouts'] += 1
+
+        while True:
+            try:
+                connection, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(connection, idle_since):
+                return PooledConnection(self, connection)
+            self._discard(connection)
+            self._free_slot(overflow=False)
+
+        slot = self._reserve_slot()
+        if slot:
+            return self._open_in_slot(slot)
+
+        # Pool and overflow are both in use, wait for someone to release
+        with self._lock:
+            self._stats['waits'] += 1
+        started = time.monotonic()
+        deadline = started + self.timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self._stats['failures'] += 1
+                    raise PoolExhausted(f"No database connection available after {self.timeout}s")
+                try:
+                    connection, idle_since = self._idle.get(timeout=min(remaining, 0.1))
+                except queue.Empty:
+                    # An overflow connection may have been closed in the meantime
+                    slot = self._reserve_slot()
+                    if slot:
+                        return self._open_in_slot(slot)
+                    continue
+                if self._is_healthy(connection, idle_since):
+                    return PooledConnection(self, connection)
+                self._discard(connection)
+                self._free_slot(overflow=False)
+        finally:
+            with self._lock:
+                self._stats['wait_time'] += time.monotonic() - started
+
+    def _release(self, connection, overflow):
+        if overflow:
+            self._discard(connection)
+            self._free_slot(overflow=True)
+            return
+        try:
+            # Drop anything a helper left uncommitted before handing it to the next one
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            self._free_slot(overflow=False)
+            return
+        try:
+            self._idle.put_nowait((connection, time.monotonic()))
+        except queue.Full:
+            self._discard(connection)
+            self._free_slot(overflow=False)
+
+    def close_all(self):
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+            self._free_slot(overflow=False)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['max_overflow'] = self.max_overflow
+            stats['open'] = self._opened + self._overflow
+            stats['overflow_in_use'] = self._overflow
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['open'] - stats['idle']
+        return stats
@@ -0,0 +1,268 @@
+import errno
+import hashlib
+import os
+import stat
+import threading
+import time
+import uuid
+
+READ_BLOCK_SIZE = 1024 * 1024
+# Created in the blob folder by the first worker to claim the startup scan
+FIRST_SCAN_MARKER = '.first-scan'
+
+
+def file_digest(path, report=lambda count: None):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                return digest.hexdigest()
+            digest.update(block)
+            report(len(block))
+
+
+class BlobStore:
+    """
+    Content-addressed storage for the upload folder, one copy per distinct file.
+
+    Each distinct content is kept once as `<blob_folder>/<aa>/<sha256>` and
+    every file in the folders with that content is a hardlink to it, so the
+    filesystem's link count is the reference count: deleting a file drops
+    one link, and a blob left with only its own link is garbage collected.
+    Uploads are hashed as they are written and linked straight away; scan()
+    deduplicates files that were already there, hashing only files whose
+    size matches another file or blob. The blob folder must be on the same
+    filesystem as the files it deduplicates.
+
+    Hardlinked files share their inode, so files under `root` must only be
+    replaced (os.replace), never rewritten in place.
+
+    Args:
+        root (str): Folder whose files are deduplicated.
+        blob_folder (str): Where the blobs are kept, usually inside `root`.
+        excluded (set): Entry names under `root` that are never scanned.
+        min_size (int): Smaller files are left alone, a link would save little.
+    """
+
+    def __init__(self, root, blob_folder, excluded=(), min_size=64 * 1024):
+        self.root = os.path.abspath(root)
+        self.blob_folder = os.path.abspath(blob_folder)
+        self.excluded = set(excluded)
+        self.min_size = min_size
+        self._lock = threading.Lock()
+        self.last_scan = None
+        os.makedirs(self.blob_folder, exist_ok=True)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_folder, digest[:2], digest)
+
+    def _temporary(self, path):
+        head, name = os.path.split(path)
+        return os.path.join(head, f".{name}.dedup-{uuid.uuid4().hex[:8]}")
+
+    def link(self, path, digest, file_stat=None):
+        """
+        Makes `path` a link to the blob of `digest`, creating the blob from
+        `path` if this content is new. Returns the bytes reclaimed.
+
+        Args:
+            file_stat (os.stat_result): lstat of `path` taken before it was
+                hashed; the file is left alone if it changed since.
+        """
+        try:
+            current = os.lstat(path)
+        except FileNotFoundError:
+            return 0
+        if file_stat is None:
+            file_stat = current
+        elif not self._unchanged(file_stat, current):
+            return 0
+        if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < self.min_size:
+            return 0
+        blob = self._blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            # New content: this file becomes the blob, nothing to reclaim
+            os.link(path, blob)
+            return 0
+        except FileExistsError:
+            pass
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                return 0
+            raise
+        blob_stat = os.stat(blob)
+        if (blob_stat.st_dev, blob_stat.st_ino) == (file_stat.st_dev, file_stat.st_ino):
+            return 0
+        if blob_stat.st_size != file_stat.st_size:
+            print(f"Blob com tamanho errado, ignorado: {blob}")
+            return 0
+        temporary = self._temporary(path)
+        os.link(blob, temporary)
+        try:
+            # Written to since it was hashed, leave it for the next scan
+            if not self._unchanged(file_stat, os.lstat(path)):
+                os.remove(temporary)
+                return 0
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+            raise
+        return file_stat.st_size
+
+    @staticmethod
+    def _unchanged(before, after):
+        return (before.st_dev, before.st_ino, before.st_size, before.st_mtime_ns) == \
+            (after.st_dev, after.st_ino, after.st_size, after.st_mtime_ns)
+
+    def save_stream(self, stream, destination):
+        """Writes an upload to `destination`, hashing it on the way, and links it to its blob."""
+        digest = hashlib.sha256()
+        temporary = self._temporary(destination)
+        try:
+            with open(temporary, 'xb') as f:
+                while True:
+                    block = stream.read(READ_BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    f.write(block)
+                f.flush()
+                file_stat = os.fstat(f.fileno())
+            os.replace(temporary, destination)
+        except BaseException:
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+            raise
+        try:
+            self.link(destination, digest.hexdigest(), file_stat)
+        except OSError as e:
+            # The upload itself is in place, the next scan can link it
+            print(f"Erro ao deduplicar {destination}: {e}")
+        return digest.hexdigest()
+
+    def _blobs(self):
+        """Yields (path, stat) of every blob."""
+        with os.scandir(self.blob_folder) as prefixes:
+            for prefix in prefixes:
+                if not prefix.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(prefix.path) as blobs:
+                    for blob in blobs:
+                        try:
+                            yield blob.path, blob.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+
+    def _files(self):
+        """Yields (path, stat) of the regular files under root worth deduplicating."""
+        for folder, folders, names in os.walk(self.root):
+            folders[:] = [name for name in folders
+                          if name not in self.excluded and os.path.join(folder, name) != self.blob_folder]
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    file_stat = os.lstat(path)
+                except OSError:
+                    continue
+                if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size >= self.min_size:
+                    yield path, file_stat
+
+    def collect(self):
+        """Deletes the blobs nothing links to anymore, returns (blobs, bytes) freed."""
+        freed = 0
+        count = 0
+        for path, blob_stat in list(self._blobs()):
+            if blob_stat.st_nlink <= 1:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                count += 1
+                freed += blob_stat.st_size
+        return count, freed
+
+    def claim_first_scan(self):
+        """
+        True for the one caller, across processes and restarts, that should
+        run the initial scan of a new blob folder; later scans are asked for.
+        """
+        try:
+            os.close(os.open(os.path.join(self.blob_folder, FIRST_SCAN_MARKER), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def scan(self, job=None):
+        """
+        Deduplicates the files already under root and collects orphan blobs.
+        Reports hashing progress in bytes to `job` when given.
+        """
+        with self._lock:
+            started = time.time()
+            if job:
+                job.set_step('Looking for files with the same size')
+            blob_inodes = set()
+            sizes = {}
+            for _, blob_stat in self._blobs():
+                blob_inodes.add((blob_stat.st_dev, blob_stat.st_ino))
+                sizes[blob_stat.st_size] = sizes.get(blob_stat.st_size, 0) + 1
+            files = []
+            for path, file_stat in self._files():
+                if (file_stat.st_dev, file_stat.st_ino) in blob_inodes:
+                    continue
+                files.append((path, file_stat))
+                sizes[file_stat.st_size] = sizes.get(file_stat.st_size, 0) + 1
+            # A size seen once, among blobs and files alike, cannot be a duplicate
+            candidates = [(path, file_stat) for path, file_stat in files if sizes[file_stat.st_size] > 1]
+            total = sum(file_stat.st_size for _, file_stat in candidates)
+            done = 0
+
+            def report(count):
+                nonlocal done
+                done += count
+                if job:
+                    job.set_progress(done, total)
+
+            if job:
+                job.log(f"{len(files)} files not deduplicated yet, {len(candidates)} to hash")
+                job.set_step('Hashing')
+            reclaimed = 0
+            linked = 0
+            for path, file_stat in candidates:
+                try:
+                    saved = self.link(path, file_digest(path, report), file_stat)
+                except OSError as e:
+                    print(f"Erro ao deduplicar {path}: {e}")
+                    continue
+                if saved:
+                    linked += 1
+                    reclaimed += saved
+            blobs_freed, bytes_freed = self.collect()
+            self.last_scan = {'finished_at': time.time(), 'seconds': round(time.time() - started, 1),
+                              'hashed_files': len(candidates), 'hashed_bytes': done,
+                              'linked_files': linked, 'reclaimed_bytes': reclaimed,
+                              'collected_blobs': blobs_freed, 'collected_bytes': bytes_freed}
+            if job:
+                job.log(f"Linked {linked} duplicate files, {reclaimed} bytes reclaimed")
+            return self.last_scan
+
+    def report(self):
+        """
+        Blobs, the files linking to them and the bytes those links save:
+        a blob with n references stores once what would otherwise take n copies.
+        """
+        blobs = 0
+        stored = 0
+        references = 0
+        saved = 0
+        for _, blob_stat in self._blobs():
+            links = max(blob_stat.st_nlink - 1, 0)
+            blobs += 1
+            stored += blob_stat.st_size
+            references += links
+            saved += blob_stat.st_size * max(links - 1, 0)
+        return {'blobs': blobs, 'stored_bytes': stored, 'references': references,
+                'reclaimed_bytes': saved, 'last_scan': self.last_scan}
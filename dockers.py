@@ -1,30 +1,247 @@
+import os
+import shutil
 import subprocess
+import threading
 from pathlib import Path
-import socket
 
+import docker
 
-def run_command(command, password=None):
-    """Executa um comando no terminal e retorna a saída."""
+import host_facts
+import metrics
+
+
+class CommandError(Exception):
+    """Raised when a streamed command exits with a non-zero code."""
+
+    def __init__(self, command, returncode):
+        super().__init__(f"Comando falhou com código {returncode}: {command}")
+        self.command = command
+        self.returncode = returncode
+
+
+def redact(text, secrets):
+    """Replaces every non-empty secret in `text` with ***."""
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, '***')
+    return text
+
+
+def run_command(command, password=None, on_output=None, secrets=()):
+    """
+    Executa um comando no terminal e retorna a saída.
+
+    Com on_output, cada linha (stdout e stderr juntos) é entregue assim que
+    aparece, em vez de esperar o fim do comando, e um código de saída
+    diferente de zero levanta CommandError. A senha e os `secrets` nunca
+    aparecem no que é registrado: são trocados por *** no comando, na
+    saída e no erro.
+    """
+    secrets = [password, *secrets]
+    display_command = redact(command, secrets)
     if password:
         # Use echo e pipe para fornecer a senha ao sudo
         command = f"echo {password} | sudo -S {command}"
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
+    with metrics.timed('subprocess', metrics.subprocess_seconds, program=metrics.program_name(display_command)):
+        if on_output is None:
+            process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdout, stderr = process.communicate()
+            if process.returncode != 0:
+                print(f"Erro ao executar comando: {redact(stderr.decode().strip(), secrets)}")
+            return stdout.decode().strip()
+
+        on_output(f"$ {display_command}")
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, bufsize=1)
+        lines = []
+        for line in process.stdout:
+            line = redact(line.rstrip('\n'), secrets)
+            lines.append(line)
+            on_output(line)
+        process.wait()
     if process.returncode != 0:
-        print(f"Erro ao executar comando: {stderr.decode().strip()}")
-    return stdout.decode().strip()
+        on_output(f"Erro ao executar comando (código {process.returncode})")
+        raise CommandError(display_command, process.returncode)
+    return "\n".join(lines).strip()
+
+class DockerEngine:
+    """
+    Long-lived Docker Engine API client with an in-memory container table.
+
+    The table is filled once from the container list and then kept current
+    by the Engine's events stream, so page loads read it without talking to
+    the daemon or forking the docker CLI. If the daemon goes away the
+    watcher reconnects with backoff and resynchronises.
+    """
+
+    EVENTS = ('create', 'start', 'restart', 'die', 'stop', 'kill', 'pause', 'unpause', 'rename', 'destroy', 'health_status')
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        self.client = None
+        self.containers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='docker-events', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.client is not None:
+            self.client.close()
+
+    @property
+    def available(self):
+        """True while the Engine API is reachable."""
+        return self._connected.is_set()
+
+    def cli_installed(self):
+        """Whether the docker CLI is on PATH, checked without running it."""
+        return shutil.which('docker') is not None
+
+    def installed(self):
+        return self.available or self.cli_installed()
+
+    def _connect(self):
+        if self.base_url:
+            client = docker.DockerClient(base_url=self.base_url)
+        else:
+            client = docker.from_env()
+        client.ping()
+        return client
+
+    @staticmethod
+    def _describe(container):
+        ports = {}
+        for container_port, bindings in (container.attrs.get('NetworkSettings', {}).get('Ports') or {}).items():
+            if bindings:
+                ports[container_port] = [binding.get('HostPort') for binding in bindings]
+        return {
+            'id': container.id,
+            'name': container.name,
+            'image': container.attrs.get('Config', {}).get('Image'),
+            'status': container.status,
+            'ports': ports,
+        }
+
+    def _sync(self):
+        containers = {}
+        for container in self.client.containers.list(all=True):
+            containers[container.name] = self._describe(container)
+        with self._lock:
+            self.containers = containers
+
+    def _refresh(self, container_id):
+        try:
+            container = self.client.containers.get(container_id)
+        except docker.errors.NotFound:
+            with self._lock:
+                for name, info in list(self.containers.items()):
+                    if info['id'] == container_id:
+                        del self.containers[name]
+            return
+        info = self._describe(container)
+        with self._lock:
+            # Drop the old entry too in case this was a rename
+            for name, known in list(self.containers.items()):
+                if known['id'] == container_id:
+                    del self.containers[name]
+            self.containers[info['name']] = info
+
+    def _watch(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self.client = self._connect()
+                # Subscribe before listing so nothing falls between the two
+                events = self.client.events(decode=True, filters={'type': 'container'})
+                self._sync()
+                self._connected.set()
+                backoff = 1
+                for event in events:
+                    if self._stop.is_set():
+                        break
+                    action = (event.get('Action') or event.get('status') or '').split(':')[0]
+                    if action in self.EVENTS:
+                        self._refresh(event.get('id') or event.get('Actor', {}).get('ID'))
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"Docker Engine indisponível: {e}")
+            self._connected.clear()
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def get(self, name):
+        with self._lock:
+            info = self.containers.get(name)
+            return dict(info) if info else None
+
+    def list(self):
+        with self._lock:
+            return [dict(info) for info in self.containers.values()]
+
+    def pull(self, image, on_output=None):
+        """Pulls an image, reporting layer progress through on_output."""
+        log = on_output or print
+        repository, _, tag = image.partition(':')
+        last_status = {}
+        for progress in self.client.api.pull(repository, tag=tag or 'latest', stream=True, decode=True):
+            layer = progress.get('id', '')
+            status = progress.get('status', '')
+            # Only report status changes, not every byte-count update
+            if last_status.get(layer) != status:
+                last_status[layer] = status
+                log(f"{layer}: {status}" if layer else status)
+
+    def run(self, image, name, on_output=None, **options):
+        """Creates and starts a container, pulling the image first if needed."""
+        log = on_output or print
+        try:
+            self.client.images.get(image)
+        except docker.errors.ImageNotFound:
+            log(f"Pulling {image}...")
+            self.pull(image, on_output=on_output)
+        container = self.client.containers.run(image, name=name, detach=True, **options)
+        log(f"Container {name} iniciado ({container.short_id})")
+        self._refresh(container.id)
+        return container
+
+    def start_container(self, name, on_output=None):
+        log = on_output or print
+        container = self.client.containers.get(name)
+        container.start()
+        log(f"Container {name} iniciado")
+        self._refresh(container.id)
+
+    def remove_container(self, name, on_output=None):
+        log = on_output or print
+        container = self.client.containers.get(name)
+        container.stop()
+        container.remove()
+        log(f"Container {name} removido")
+
+
+engine = DockerEngine(base_url=os.environ.get('DOCKER_HOST') or None)
+
+
+def container_exists(name, password=None):
+    """Whether a container called `name` exists, from the Engine's table or by asking the CLI."""
+    if engine.available:
+        return engine.get(name) is not None
+    # inspect prints nothing (and fails) for an unknown container
+    return bool(run_command(f"docker container inspect --format '{{{{.Id}}}}' {name}", password=password))
+
 
 def get_local_ip():
-    try:
-        # Conecta-se a um servidor externo (por exemplo, Google DNS) para obter o IP local
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-    except Exception as e:
-        return f"Erro ao tentar obter o IP local: {e}"
-    
-    return ip
+    """Retorna o IP local a partir dos dados do host em cache (funciona offline)."""
+    return host_facts.facts.local_ip
 
 def create_directory(path):
     """
@@ -37,29 +254,27 @@ def create_directory(path):
     directory.mkdir(parents=True, exist_ok=True)
     print(f"Diretório criado: {directory}")
 
-def install_docker_linux(password):
+def install_docker_linux(password, on_output=None):
     """Instala Docker em sistemas Linux."""
     passw = password
-    print("Instalando Docker no Linux...")
-
-    output = run_command("apt update -y", password=passw)
-    print(output)
-    output = run_command("apt install apt-transport-https ca-certificates curl software-properties-common -y", password=passw)
-    print(output)
-    output = run_command('curl -fsSL https://download.docker.com/linux/ubuntu/gpg | sudo apt-key add -')
-    print(output)
-    output = run_command('add-apt-repository "deb [arch=amd64] https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable"', password=passw)
-    print(output)
-    output = run_command('apt update -y', password=passw)
-    print(output)
-    output = run_command('apt-cache policy docker-ce')
-    print(output)
-    output = run_command('apt install docker-ce -y', password=passw)
-    print(output)
-    output = run_command('systemctl status docker', password=passw)
-    print(output)
-    output = run_command('usermod -aG docker ${USER}', password=passw)
-    print(output)
+    log = on_output or print
+    log("Instalando Docker no Linux...")
+
+    commands = [
+        ("apt update -y", passw),
+        ("apt install apt-transport-https ca-certificates curl software-properties-common -y", passw),
+        ('curl -fsSL https://download.docker.com/linux/ubuntu/gpg | sudo apt-key add -', None),
+        ('add-apt-repository "deb [arch=amd64] https://download.docker.com/linux/ubuntu $(lsb_release -cs) stable"', passw),
+        ('apt update -y', passw),
+        ('apt-cache policy docker-ce', None),
+        ('apt install docker-ce -y', passw),
+        ('systemctl status docker', passw),
+        ('usermod -aG docker ${USER}', passw),
+    ]
+    for command, command_password in commands:
+        output = run_command(command, password=command_password, on_output=on_output)
+        if on_output is None:
+            print(output)
 
 def install_docker_windows():
     """Instala Docker no Windows usando winget."""
@@ -73,40 +288,74 @@ def start_docker_service_linux():
     run_command("sudo systemctl enable docker")
 
 
-def run_openwebui_container(password):
-    print("Running the Open WebUI container...")
+OPEN_WEBUI_IMAGE = "ghcr.io/open-webui/open-webui:main"
+OLLAMA_IMAGE = "ollama/ollama"
+PIHOLE_IMAGE = "pihole/pihole"
+
+
+def run_openwebui_container(password, on_output=None):
+    log = on_output or print
+    log("Running the Open WebUI container...")
+    if engine.available:
+        engine.run(OPEN_WEBUI_IMAGE, 'open-webui', on_output=on_output,
+                   network_mode='host',
+                   volumes={'open-webui': {'bind': '/app/backend/data', 'mode': 'rw'}},
+                   environment={'OLLAMA_BASE_URL': 'http://127.0.0.1:11434'},
+                   restart_policy={'Name': 'always'})
+        return
+    # Sem acesso ao socket do Docker, usa o CLI com sudo
     open_webui_command = (
-        "docker run -d --network=host -v open-webui:/app/backend/data -e OLLAMA_BASE_URL=http://127.0.0.1:11434 --name open-webui --restart always ghcr.io/open-webui/open-webui:main"
+        f"docker run -d --network=host -v open-webui:/app/backend/data -e OLLAMA_BASE_URL=http://127.0.0.1:11434 --name open-webui --restart always {OPEN_WEBUI_IMAGE}"
     )
-    open_webui_output = run_command(open_webui_command, password=password)
-    print(f"Open WebUI output: {open_webui_output}")
+    open_webui_output = run_command(open_webui_command, password=password, on_output=on_output)
+    log(f"Open WebUI output: {open_webui_output}")
 
 
-def start_ollama_container(password):
-    print(run_command("docker start ollama", password=password))
+def start_ollama_container(password, on_output=None):
+    log = on_output or print
+    if engine.available:
+        engine.start_container('ollama', on_output=on_output)
+        return
+    log(run_command("docker start ollama", password=password, on_output=on_output))
 
-def run_ollama_container(password):
+def run_ollama_container(password, on_output=None):
     """Executes the Ollama and Open WebUI containers."""
-    try:
-        print("Running the Ollama container...")
+    log = on_output or print
+    log("Running the Ollama container...")
+    if engine.available:
+        engine.run(OLLAMA_IMAGE, 'ollama', on_output=on_output,
+                   volumes={'ollama': {'bind': '/root/.ollama', 'mode': 'rw'}},
+                   environment={'OLLAMA_HOST': '0.0.0.0'},
+                   ports={'11434/tcp': 11434})
+    else:
         ollama_command = (
             "docker run -d -v ollama:/root/.ollama "
             "-e OLLAMA_HOST=0.0.0.0 "
-            "-p 11434:11434 --name ollama ollama/ollama"
+            f"-p 11434:11434 --name ollama {OLLAMA_IMAGE}"
         )
-        ollama_output = run_command(ollama_command, password=password)
-        print(f"Ollama output: {ollama_output}")
+        ollama_output = run_command(ollama_command, password=password, on_output=on_output)
+        log(f"Ollama output: {ollama_output}")
 
-        print("Ollama installation finished!")
-    except Exception as e:
-        print(f"Error occurred: {e}")
+    log("Ollama installation finished!")
 
-def run_pihole_container(password):
+def run_pihole_container(password, on_output=None):
     """Executa o container Pi-hole."""
-    print("Criando diretórios para o Pi-hole...")
+    log = on_output or print
+    log("Criando diretórios para o Pi-hole...")
     create_directory("~/docker/pihole/config")
     create_directory("~/docker/pihole/dnsmasq.d")
-    print("Rodando o container Pi-hole...")
+    log("Rodando o container Pi-hole...")
+    if engine.available:
+        engine.run(PIHOLE_IMAGE, 'pihole', on_output=on_output,
+                   ports={'53/tcp': 8053, '53/udp': 8053, '80/tcp': 8090, '443/tcp': 8453},
+                   environment={'TZ': 'America/New_York', 'WEBPASSWORD': password},
+                   volumes={
+                       os.path.expanduser('~/docker/pihole/config'): {'bind': '/etc/pihole', 'mode': 'rw'},
+                       os.path.expanduser('~/docker/pihole/dnsmasq.d'): {'bind': '/etc/dnsmasq.d', 'mode': 'rw'},
+                   },
+                   dns=['127.0.0.1', '1.1.1.1'],
+                   restart_policy={'Name': 'unless-stopped'})
+        return
     command = (
         f"docker run -d "
         f"--name pihole "
@@ -121,6 +370,6 @@ def run_pihole_container(password):
         f"--dns=127.0.0.1 "
         f"--dns=1.1.1.1 "
         f"--restart=unless-stopped "
-        f"pihole/pihole"
+        f"{PIHOLE_IMAGE}"
     )
-    run_command(command, password=password)
\ No newline at end of file
+    run_command(command, password=password, on_output=on_output)
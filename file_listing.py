@@ -0,0 +1,151 @@
+import base64
+import bisect
+import json
+import os
+import threading
+from collections import OrderedDict
+
+SORT_KEYS = ('name', 'size', 'mtime')
+
+
+class ListingError(Exception):
+    """Raised for unknown sort keys or cursors that cannot be decoded."""
+
+
+def _sort_key(entry, sort):
+    # Folders always come first, name breaks ties so the order is total
+    if sort == 'name':
+        return (not entry['is_dir'], entry['name'].lower(), entry['name'])
+    return (not entry['is_dir'], entry[sort] or 0, entry['name'].lower(), entry['name'])
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, sort='name'):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ListingError("Invalid cursor")
+    # Must have the shape _sort_key gives for this sort, anything else is forged
+    if not isinstance(key, list) or len(key) != (3 if sort == 'name' else 4):
+        raise ListingError("Invalid cursor")
+    return tuple(key)
+
+
+class DirectoryListingCache:
+    """
+    Directory listings built with a single os.scandir pass.
+
+    Each listing is cached with the directory's mtime and rebuilt when the
+    mtime changes, which happens whenever an entry is added, removed or
+    renamed. Sorted views are cached alongside so paging through a large
+    folder only sorts it once.
+
+    Args:
+        max_directories (int): Listings kept in memory, least recently used go first.
+        hidden (set): Entry names never returned (the server's own folders).
+    """
+
+    def __init__(self, max_directories=256, hidden=()):
+        self.max_directories = max_directories
+        self.hidden = set(hidden)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _scan(self, path):
+        entries = []
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                if entry.name in self.hidden:
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append({
+                    'name': entry.name,
+                    'is_dir': is_dir,
+                    'size': None if is_dir else stat.st_size,
+                    'mtime': stat.st_mtime,
+                })
+        return entries
+
+    def entries(self, path):
+        """Returns every entry of `path`, rescanning only if the directory changed."""
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached and cached['mtime_ns'] == mtime_ns:
+                self._cache.move_to_end(path)
+                return cached['entries']
+
+        entries = self._scan(path)
+        with self._lock:
+            self._cache[path] = {'mtime_ns': mtime_ns, 'entries': entries, 'sorted': {}}
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.max_directories:
+                self._cache.popitem(last=False)
+        return entries
+
+    def _sorted(self, path, sort):
+        """Returns (entries, keys, folder_count) in ascending order, cached per sort key."""
+        entries = self.entries(path)
+        with self._lock:
+            cached = self._cache.get(path)
+            views = cached['sorted'] if cached and cached['entries'] is entries else {}
+            view = views.get(sort)
+        if view is None:
+            ordered = sorted(entries, key=lambda entry: _sort_key(entry, sort))
+            keys = [_sort_key(entry, sort) for entry in ordered]
+            folder_count = bisect.bisect_left(keys, (True,))
+            view = (ordered, keys, folder_count)
+            views[sort] = view
+        return view
+
+    def page(self, path, sort='name', order='asc', cursor=None, limit=200):
+        """
+        Returns {'entries': [...], 'next_cursor': str or None, 'total': int}.
+
+        The cursor encodes the sort key of the last entry returned, so new
+        files showing up between requests do not shift the following pages.
+        Folders stay ahead of files in both orders.
+        """
+        if sort not in SORT_KEYS:
+            raise ListingError(f"Unknown sort key: {sort}")
+        ordered, keys, folder_count = self._sorted(path, sort)
+        key = decode_cursor(cursor, sort) if cursor else None
+        try:
+            remaining = self._after(ordered, keys, folder_count, key, order)
+        except TypeError:
+            # A cursor handed out for a different sort key
+            raise ListingError("Invalid cursor")
+
+        page = remaining[:limit]
+        next_cursor = None
+        if len(remaining) > limit:
+            next_cursor = encode_cursor(_sort_key(page[-1], sort))
+        return {'entries': page, 'next_cursor': next_cursor, 'total': len(ordered)}
+
+    @staticmethod
+    def _after(ordered, keys, folder_count, key, order):
+        """Returns the entries that follow `key` in the requested order."""
+        if order == 'desc':
+            if key is None:
+                remaining = ordered[:folder_count][::-1] + ordered[folder_count:][::-1]
+            else:
+                end = bisect.bisect_left(keys, key)
+                if key[0]:
+                    remaining = ordered[folder_count:end][::-1]
+                else:
+                    remaining = ordered[:end][::-1] + ordered[folder_count:][::-1]
+        else:
+            start = bisect.bisect_right(keys, key) if key is not None else 0
+            remaining = ordered[start:]
+        return remaining
+
+    def invalidate(self, path):
+        with self._lock:
+            self._cache.pop(path, None)
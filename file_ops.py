@@ -0,0 +1,295 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows, copies simply skip the reflink attempt
+    fcntl = None
+
+# ioctl asking a copy-on-write filesystem (Btrfs, XFS) to share the source's extents
+FICLONE = 0x40049409
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class FileOpError(Exception):
+    """Raised when a move or copy cannot be done (missing source, existing destination...)."""
+
+
+def _reflink(source_fd, destination_fd):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(destination_fd, FICLONE, source_fd)
+        return True
+    except OSError:
+        return False
+
+
+def _copy_data(source_fd, destination_fd, report):
+    """Copies from the current offsets, in the kernel when copy_file_range is available."""
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while True:
+                count = os.copy_file_range(source_fd, destination_fd, COPY_CHUNK_SIZE)
+                if count == 0:
+                    return
+                copied += count
+                report(count)
+        except OSError as e:
+            # Older kernels refuse cross-filesystem ranges, some filesystems none at all
+            if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                raise
+    while True:
+        block = os.read(source_fd, READ_BLOCK_SIZE)
+        if not block:
+            return
+        view = memoryview(block)
+        while view:
+            written = os.write(destination_fd, view)
+            view = view[written:]
+        report(len(block))
+
+
+def copy_file(source, destination, report=lambda count: None):
+    """
+    Copies one file with its permissions and times, cheapest method first:
+    a reflink, then copy_file_range, then a plain read/write loop.
+    report(count) is called as bytes are copied.
+    """
+    with open(source, 'rb') as src, open(destination, 'xb') as dst:
+        if _reflink(src.fileno(), dst.fileno()):
+            report(os.fstat(src.fileno()).st_size)
+        else:
+            _copy_data(src.fileno(), dst.fileno(), report)
+    shutil.copystat(source, destination)
+
+
+def tree_size(path):
+    """Returns (bytes, files) of the regular files at or below `path`."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        paths = (os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    else:
+        paths = [path]
+    size = 0
+    files = 0
+    for file_path in paths:
+        try:
+            file_stat = os.lstat(file_path)
+        except OSError:
+            continue
+        if stat.S_ISREG(file_stat.st_mode):
+            size += file_stat.st_size
+            files += 1
+    return size, files
+
+
+class FileOperations:
+    """
+    Delete, move and copy for the file manager without blocking requests.
+
+    Deleting renames the entry into `trash_folder` (one rename, whatever its
+    size) and a background thread purges the trash once entries are older
+    than `retention` seconds. Moves on one filesystem are a single atomic
+    rename done on the spot; moves across filesystems and every copy run as
+    jobs on `job_runner`, reporting bytes done through Job.set_progress().
+    Copies go to a hidden partial name next to the destination and are
+    renamed into place when complete.
+
+    Subscribers are called as callback(event, path, is_dir) with 'created'
+    or 'deleted', like FileSystemWatcher's.
+
+    Args:
+        trash_folder (str): Trash area, on the same filesystem as the files.
+        job_runner (jobs.JobRunner): Runs the copies.
+        retention (float): Seconds deleted entries stay in the trash.
+        purge_interval (float): Longest time between two trash purges.
+        on_purge (callable): Called after a purge that deleted something.
+    """
+
+    def __init__(self, trash_folder, job_runner, retention=0, purge_interval=60, on_purge=None):
+        self.trash_folder = trash_folder
+        self.jobs = job_runner
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self.on_purge = on_purge
+        self._subscribers = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(trash_folder, exist_ok=True)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def _notify(self, event, path, is_dir):
+        for callback in self._subscribers:
+            try:
+                callback(event, path, is_dir)
+            except Exception as e:
+                print(f"File operations subscriber error: {e}")
+
+    # Trash
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='trash-purger', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.purge() and self.on_purge:
+                    self.on_purge()
+            except Exception as e:
+                print(f"Erro ao esvaziar o lixo: {e}")
+            self._wake.wait(timeout=self.purge_interval)
+            self._wake.clear()
+
+    def trash(self, path):
+        """
+        Removes `path` from view right away. Returns None, or the Job deleting
+        it in place when it is on another filesystem than the trash.
+        """
+        is_dir = os.path.isdir(path)
+        entry = os.path.join(self.trash_folder, f"{time.time():.0f}-{uuid.uuid4().hex}")
+        os.mkdir(entry)
+        try:
+            os.rename(path, os.path.join(entry, os.path.basename(os.path.normpath(path))))
+        except OSError as e:
+            os.rmdir(entry)
+            if e.errno != errno.EXDEV:
+                raise
+            return self.jobs.submit(f"Delete {os.path.basename(os.path.normpath(path))}",
+                                    self._delete_job, path)
+        self._notify('deleted', path, is_dir)
+        self._wake.set()
+        return None
+
+    def _delete_job(self, job, path):
+        job.set_step(f"Deleting {path}")
+        is_dir = os.path.isdir(path) and not os.path.islink(path)
+        if is_dir:
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        self._notify('deleted', path, is_dir)
+
+    def purge(self):
+        """Deletes the trash entries older than `retention`, returns how many went."""
+        cutoff = time.time() - self.retention
+        purged = 0
+        with os.scandir(self.trash_folder) as iterator:
+            entries = list(iterator)
+        for entry in entries:
+            try:
+                deleted_at = float(entry.name.split('-', 1)[0])
+            except ValueError:
+                deleted_at = 0
+            if deleted_at > cutoff:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            purged += 1
+        return purged
+
+    # Move and copy
+
+    def _check(self, source, destination):
+        if not os.path.lexists(source):
+            raise FileOpError("Source not found")
+        if os.path.lexists(destination):
+            raise FileOpError("Destination already exists")
+        if not os.path.isdir(os.path.dirname(os.path.normpath(destination))):
+            raise FileOpError("Destination folder not found")
+        source = os.path.abspath(source)
+        if os.path.commonpath([source, os.path.abspath(destination)]) == source:
+            raise FileOpError("Cannot put a folder inside itself")
+
+    def move(self, source, destination):
+        """
+        Renames `source` to `destination` atomically when both are on one
+        filesystem and returns None; otherwise returns the Job copying it
+        across and then deleting the original.
+        """
+        self._check(source, destination)
+        is_dir = os.path.isdir(source)
+        try:
+            os.rename(source, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise FileOpError(f"Cannot move: {e.strerror}")
+            return self.jobs.submit(f"Move {os.path.basename(os.path.normpath(source))}",
+                                    self._move_job, source, destination)
+        self._notify('deleted', source, is_dir)
+        self._notify('created', destination, is_dir)
+        return None
+
+    def copy(self, source, destination):
+        """Returns the Job copying `source` to `destination`."""
+        self._check(source, destination)
+        return self.jobs.submit(f"Copy {os.path.basename(os.path.normpath(source))}",
+                                self._copy_job, source, destination)
+
+    def _move_job(self, job, source, destination):
+        self._copy_job(job, source, destination)
+        job.set_step(f"Removing {source}")
+        self.trash(source)
+
+    def _copy_job(self, job, source, destination):
+        job.set_step(f"Counting {source}")
+        total, files = tree_size(source)
+        job.log(f"{files} files, {total} bytes")
+        done = 0
+
+        def report(count):
+            nonlocal done
+            done += count
+            job.set_progress(done, total)
+
+        job.set_progress(0, total)
+        job.set_step(f"Copying to {destination}")
+        head, name = os.path.split(os.path.normpath(destination))
+        partial = os.path.join(head, f".{name}.partial-{uuid.uuid4().hex[:8]}")
+        try:
+            self._copy_entry(source, partial, report)
+            if os.path.lexists(destination):
+                raise FileOpError("Destination already exists")
+            os.rename(partial, destination)
+        except BaseException:
+            if os.path.isdir(partial) and not os.path.islink(partial):
+                shutil.rmtree(partial, ignore_errors=True)
+            elif os.path.lexists(partial):
+                os.remove(partial)
+            raise
+        self._notify('created', destination, os.path.isdir(destination))
+        job.log(f"Copied {done} bytes")
+
+    def _copy_entry(self, source, destination, report):
+        if os.path.islink(source):
+            os.symlink(os.readlink(source), destination)
+        elif os.path.isdir(source):
+            os.mkdir(destination)
+            with os.scandir(source) as iterator:
+                entries = list(iterator)
+            for entry in entries:
+                if entry.is_symlink() or entry.is_dir(follow_symlinks=False) or entry.is_file(follow_symlinks=False):
+                    self._copy_entry(entry.path, os.path.join(destination, entry.name), report)
+            shutil.copystat(source, destination)
+        else:
+            copy_file(source, destination, report)
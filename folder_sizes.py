@@ -0,0 +1,191 @@
+import os
+import stat
+import threading
+
+
+class FolderSizes:
+    """
+    Bytes and file count of every folder under `root`, subfolders included.
+
+    One background walk builds the totals at start; after that every change
+    is applied to the folder it happened in and its ancestors only, so an
+    upload costs O(depth) and reading a total is a dict lookup. Changes come
+    from the routes (update_path / remove_path) and from the filesystem
+    watcher and file operations through handle_event(). Sizes are apparent
+    sizes: hardlinked copies count once per folder they appear in.
+
+    Args:
+        root (str): Folder tree to account for.
+        excluded (set): Entry names never counted (the server's own folders).
+    """
+
+    def __init__(self, root, excluded=()):
+        self.root = os.path.abspath(root)
+        self.excluded = set(excluded)
+        # Relative folder path ('' for root) -> {'files': {name: size}, 'folders': set(), 'bytes', 'count'}
+        self._folders = {}
+        self._lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def _relative(self, path):
+        relative_path = os.path.relpath(os.path.abspath(path), self.root)
+        if relative_path == '.':
+            return ''
+        if relative_path.startswith('..'):
+            return None
+        if any(part in self.excluded for part in relative_path.split(os.sep)):
+            return None
+        return relative_path
+
+    def _walk(self, relative_path):
+        """Reads the tree at `relative_path` from disk into new nodes, outside the lock."""
+        nodes = {}
+        top = os.path.join(self.root, relative_path)
+        for folder, folders, names in os.walk(top):
+            folders[:] = [name for name in folders if name not in self.excluded]
+            files = {}
+            for name in names:
+                try:
+                    file_stat = os.lstat(os.path.join(folder, name))
+                except OSError:
+                    continue
+                if stat.S_ISREG(file_stat.st_mode):
+                    files[name] = file_stat.st_size
+            key = os.path.normpath(os.path.relpath(folder, self.root))
+            nodes['' if key == '.' else key] = {'files': files, 'folders': set(folders),
+                                                'bytes': sum(files.values()), 'count': len(files)}
+        # Children before parents, so each folder adds up complete subtotals
+        for key in sorted(nodes, key=lambda key: key.count(os.sep) if key else -1, reverse=True):
+            parent = self._parent(key)
+            if key != relative_path and parent in nodes:
+                nodes[parent]['bytes'] += nodes[key]['bytes']
+                nodes[parent]['count'] += nodes[key]['count']
+        return nodes
+
+    @staticmethod
+    def _parent(relative_path):
+        return os.path.dirname(relative_path)
+
+    def _ancestors(self, relative_path):
+        """The folder holding `relative_path`, then its parents up to root."""
+        while relative_path:
+            relative_path = self._parent(relative_path)
+            yield relative_path
+
+    def _unknown_top_locked(self, relative_path):
+        """`relative_path`, or its highest ancestor that is not accounted for yet."""
+        while relative_path and self._parent(relative_path) not in self._folders:
+            relative_path = self._parent(relative_path)
+        return relative_path
+
+    def _propagate_locked(self, relative_path, size, count):
+        for ancestor in self._ancestors(relative_path):
+            node = self._folders.get(ancestor)
+            if node is not None:
+                node['bytes'] += size
+                node['count'] += count
+
+    def _drop_locked(self, relative_path):
+        node = self._folders.pop(relative_path, None)
+        if node is not None:
+            for name in node['folders']:
+                self._drop_locked(os.path.join(relative_path, name))
+        return node
+
+    def rebuild(self):
+        try:
+            nodes = self._walk('')
+            with self._lock:
+                self._folders = nodes
+        except OSError as e:
+            print(f"Erro ao calcular o tamanho das pastas: {e}")
+        finally:
+            self.ready.set()
+
+    def start(self):
+        threading.Thread(target=self.rebuild, name='folder-sizes', daemon=True).start()
+
+    def update_path(self, path):
+        """Accounts for a new or changed file, or re-reads a folder and everything below it."""
+        relative_path = self._relative(path)
+        if relative_path is None:
+            return
+        try:
+            file_stat = os.lstat(path)
+        except FileNotFoundError:
+            self.remove_path(path)
+            return
+        if stat.S_ISDIR(file_stat.st_mode):
+            # Before the first walk is done, that walk will see it
+            if not self.ready.is_set():
+                return
+            with self._lock:
+                top = self._unknown_top_locked(relative_path)
+            if top != relative_path:
+                self.update_path(os.path.join(self.root, top))
+                return
+            nodes = self._walk(relative_path)
+            with self._lock:
+                old = self._drop_locked(relative_path)
+                self._folders.update(nodes)
+                new = nodes.get(relative_path, {'bytes': 0, 'count': 0})
+                self._propagate_locked(relative_path, new['bytes'] - (old['bytes'] if old else 0),
+                                       new['count'] - (old['count'] if old else 0))
+                parent = self._folders.get(self._parent(relative_path)) if relative_path else None
+                if parent is not None:
+                    parent['folders'].add(os.path.basename(relative_path))
+            return
+        if not stat.S_ISREG(file_stat.st_mode) or not relative_path:
+            return
+        folder, name = os.path.split(relative_path)
+        with self._lock:
+            node = self._folders.get(folder)
+            if node is not None:
+                old_size = node['files'].get(name)
+                size = file_stat.st_size - (old_size or 0)
+                count = 0 if old_size is not None else 1
+                node['files'][name] = file_stat.st_size
+                node['bytes'] += size
+                node['count'] += count
+                self._propagate_locked(folder, size, count)
+                return
+        # A folder created behind our back, read it (and any new parents) whole
+        self.update_path(os.path.join(self.root, folder))
+
+    def remove_path(self, path):
+        """Forgets a file, or a folder and everything below it."""
+        relative_path = self._relative(path)
+        if not relative_path:
+            return
+        folder, name = os.path.split(relative_path)
+        with self._lock:
+            node = self._drop_locked(relative_path)
+            if node is not None:
+                self._propagate_locked(relative_path, -node['bytes'], -node['count'])
+                parent = self._folders.get(folder)
+                if parent is not None:
+                    parent['folders'].discard(name)
+                return
+            parent = self._folders.get(folder)
+            if parent is None or name not in parent['files']:
+                return
+            size = parent['files'].pop(name)
+            parent['bytes'] -= size
+            parent['count'] -= 1
+            self._propagate_locked(folder, -size, -1)
+
+    def handle_event(self, event, path, is_dir):
+        """Subscriber for FileSystemWatcher and FileOperations."""
+        if event == 'overflow':
+            self.start()
+        elif event == 'deleted':
+            self.remove_path(path)
+        else:
+            self.update_path(path)
+
+    def get(self, path):
+        """Returns {'bytes', 'files'} for the folder at `path`, None if unknown."""
+        relative_path = self._relative(path)
+        with self._lock:
+            node = self._folders.get(relative_path) if relative_path is not None else None
+            return {'bytes': node['bytes'], 'files': node['count']} if node else None
@@ -0,0 +1,158 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def inotify_available():
+    return hasattr(os, 'uname') and os.uname().sysname == 'Linux' and ctypes.util.find_library('c') is not None
+
+
+class FileSystemWatcher:
+    """
+    Recursive inotify watcher for a directory tree, without third-party packages.
+
+    Subscribers are called from the watcher thread as
+    callback(event, path, is_dir) where event is 'created', 'deleted',
+    'modified' or 'overflow' (events were lost, the subscriber should
+    rescan `path`). Moves are reported as a delete plus a create.
+
+    Args:
+        root (str): Directory tree to watch.
+        excluded (set): Entry names that are never watched or reported.
+    """
+
+    def __init__(self, root, excluded=()):
+        self.root = os.path.abspath(root)
+        self.excluded = set(excluded)
+        self._subscribers = []
+        self._watches = {}
+        self._fd = None
+        self._libc = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def start(self):
+        """Starts watching, returns False when inotify is not available here."""
+        if self._thread and self._thread.is_alive():
+            return True
+        if not inotify_available():
+            return False
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            return False
+        self._stop.clear()
+        self._watch_tree(self.root)
+        self._thread = threading.Thread(target=self._run, name='fs-watcher', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._watches = {}
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = path
+
+    def _unwatch_tree(self, path):
+        """Drops the watches of a folder moved elsewhere, their paths are stale now."""
+        prefix = path + os.sep
+        for wd, watched in list(self._watches.items()):
+            if watched == path or watched.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                self._watches.pop(wd, None)
+
+    def _watch_tree(self, path):
+        self._add_watch(path)
+        try:
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    if entry.is_dir(follow_symlinks=False) and entry.name not in self.excluded:
+                        self._watch_tree(entry.path)
+        except OSError:
+            pass
+
+    def _notify(self, event, path, is_dir):
+        for callback in self._subscribers:
+            try:
+                callback(event, path, is_dir)
+            except Exception as e:
+                print(f"File watcher subscriber error: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._fd], [], [], 1.0)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+            self._dispatch(data)
+
+    def _dispatch(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._notify('overflow', self.root, True)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or mask & IN_DELETE_SELF:
+                continue
+            path = os.path.join(directory, name)
+            is_dir = bool(mask & IN_ISDIR)
+            if name in self.excluded:
+                continue
+
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                if is_dir:
+                    # Files may land in the new folder before its watch exists,
+                    # subscribers rescan the folder on 'created' for that reason
+                    self._watch_tree(path)
+                self._notify('created', path, is_dir)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                if is_dir and mask & IN_MOVED_FROM:
+                    self._unwatch_tree(path)
+                self._notify('deleted', path, is_dir)
+            elif mask & IN_CLOSE_WRITE:
+                self._notify('modified', path, is_dir)
@@ -0,0 +1,45 @@
+# Production launcher: gunicorn -c gunicorn.conf.py
+#
+# Reload code and workers gracefully with `kill -HUP <master pid>`, stop
+# gracefully with `kill -TERM <master pid>`: workers finish the requests in
+# flight (up to WEB_GRACEFUL_TIMEOUT seconds) and flush their writers.
+import os
+
+import dotenv
+
+# Load environment variables
+dotenv.load_dotenv()
+
+wsgi_app = 'app:app'
+bind = os.environ.get('BIND', os.environ.get('HOST', '0.0.0.0') + ':' + os.environ.get('PORT', '9900'))
+
+# Jobs, terminal sessions and the in-memory caches live in their worker,
+# so one process with many threads is the default; more workers need
+# sticky sessions in front. Open terminals and job long-polls each hold a
+# thread, TERMINAL_MAX_STREAMS caps the former.
+workers = int(os.environ.get('WEB_WORKERS', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 16))
+
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+# A worker silent for this long is killed and replaced
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+# Recycle workers now and then so a slow leak cannot grow forever
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('WEB_ACCESS_LOG') or None
+errorlog = '-'
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def post_worker_init(worker):
+    # Threads do not survive the fork, each worker starts its own services
+    from app import start_background_services
+    start_background_services()
+
+
+def worker_exit(server, worker):
+    from app import stop_background_services
+    stop_background_services()
@@ -0,0 +1,112 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HealthProber:
+    """
+    Probes service ports in the background and caches the result.
+
+    All registered services are checked concurrently every `interval`
+    seconds. Routes call status()/is_up() and never wait on a connect; a
+    result older than `ttl` triggers an early background refresh.
+
+    Args:
+        interval (float): Seconds between probe rounds.
+        ttl (float): Age after which a cached status is considered stale.
+        timeout (float): TCP connect timeout per probe.
+        workers (int): Probes running at the same time.
+    """
+
+    def __init__(self, interval=10, ttl=30, timeout=2, workers=4):
+        self.interval = interval
+        self.ttl = ttl
+        self.timeout = timeout
+        self._services = {}
+        self._status = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='health')
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, port, host='127.0.0.1'):
+        with self._lock:
+            if self._services.get(name) == (host, port):
+                return
+            self._services[name] = (host, port)
+            self._status.pop(name, None)
+        self._wake.set()
+
+    def unregister(self, name):
+        with self._lock:
+            self._services.pop(name, None)
+            self._status.pop(name, None)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._executor.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe_all()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _probe(self, name, host, port):
+        started = time.monotonic()
+        error = None
+        try:
+            with socket.create_connection((host, port), timeout=self.timeout):
+                up = True
+        except OSError as e:
+            up = False
+            error = str(e) or e.__class__.__name__
+        status = {
+            'up': up,
+            'host': host,
+            'port': port,
+            'latency_ms': round((time.monotonic() - started) * 1000, 2),
+            'checked_at': time.time(),
+            'error': error,
+        }
+        with self._lock:
+            if self._services.get(name) == (host, port):
+                self._status[name] = status
+        return status
+
+    def probe_all(self):
+        """Runs one probe round, all services at once, and waits for it."""
+        with self._lock:
+            services = list(self._services.items())
+        futures = [self._executor.submit(self._probe, name, host, port) for name, (host, port) in services]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Health probe error: {e}")
+
+    def status(self, name):
+        """Returns the cached status of `name`, or None if it was never probed."""
+        with self._lock:
+            status = self._status.get(name)
+        if status is None or time.time() - status['checked_at'] > self.ttl:
+            self._wake.set()
+        return dict(status) if status else None
+
+    def is_up(self, name):
+        status = self.status(name)
+        return bool(status and status['up'])
+
+    def all(self):
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
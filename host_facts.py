@@ -0,0 +1,194 @@
+import getpass
+import os
+import platform
+import socket
+import threading
+
+import psutil
+
+
+def default_route_interface(route_path='/proc/net/route'):
+    """Returns the interface holding the IPv4 default route, or None."""
+    try:
+        with open(route_path) as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                # Destination 00000000 with the RTF_UP|RTF_GATEWAY flags set
+                if len(fields) > 3 and fields[1] == '00000000' and int(fields[3], 16) & 0x3 == 0x3:
+                    return fields[0]
+    except OSError:
+        pass
+    return None
+
+
+def interface_addresses():
+    """Returns {interface: [IPv4 addresses]} for interfaces that are up."""
+    stats = psutil.net_if_stats()
+    addresses = {}
+    for name, entries in psutil.net_if_addrs().items():
+        if name in stats and not stats[name].isup:
+            continue
+        ipv4 = [entry.address for entry in entries if entry.family == socket.AF_INET]
+        if ipv4:
+            addresses[name] = ipv4
+    return addresses
+
+
+def pick_local_ip(addresses, preferred_interface=None):
+    """Chooses the LAN address: default-route interface first, then any non-loopback one."""
+    if preferred_interface and addresses.get(preferred_interface):
+        return addresses[preferred_interface][0]
+    for name in sorted(addresses):
+        for address in addresses[name]:
+            if not address.startswith('127.'):
+                return address
+    return '127.0.0.1'
+
+
+def disk_usage():
+    """Returns size and usage of each mounted disk, leaving out pseudo and read-only image filesystems."""
+    disks = []
+    seen = set()
+    for partition in psutil.disk_partitions(all=False):
+        if partition.device in seen or partition.fstype in ('squashfs', 'iso9660'):
+            continue
+        try:
+            usage = psutil.disk_usage(partition.mountpoint)
+        except OSError:
+            continue
+        seen.add(partition.device)
+        disks.append({
+            'mountpoint': partition.mountpoint,
+            'device': partition.device,
+            'fstype': partition.fstype,
+            'total': usage.total,
+            'used': usage.used,
+            'free': usage.free,
+            'percent': usage.percent,
+        })
+    return disks
+
+
+class HostFacts:
+    """
+    Static facts about the host, computed once and served from memory.
+
+    The network-dependent ones (local IP, interfaces) are refreshed by a
+    background thread that polls the interface table and only recomputes
+    when it changed. The same thread re-reads disk usage, so a hung network
+    mount never stalls a request. Nothing here needs Internet access.
+
+    Args:
+        poll_interval (float): Seconds between interface table checks.
+    """
+
+    def __init__(self, poll_interval=15):
+        self.poll_interval = poll_interval
+        self.system = platform.system()
+        self.system_lower = self.system.lower()
+        self.hostname = socket.gethostname()
+        self.cwd = os.getcwd()
+        try:
+            self.username = getpass.getuser()
+        except Exception:
+            self.username = str(os.getuid()) if hasattr(os, 'getuid') else 'user'
+        self._lock = threading.Lock()
+        self._signature = None
+        self._addresses = {}
+        self._local_ip = '127.0.0.1'
+        self._disks = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.refresh()
+
+    @property
+    def prompt_prefix(self):
+        if self.system == "Windows":
+            return self.cwd + " $ "
+        return self.username + "@" + self.hostname + ":/" + os.path.basename(self.cwd) + "$ "
+
+    def refresh(self):
+        """Recomputes the network facts if the interface table changed; returns True if it did."""
+        try:
+            addresses = interface_addresses()
+        except Exception as e:
+            print(f"Erro ao ler as interfaces de rede: {e}")
+            return False
+        route_interface = default_route_interface()
+        signature = (route_interface, tuple(sorted((name, tuple(ips)) for name, ips in addresses.items())))
+        with self._lock:
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            self._addresses = addresses
+            self._local_ip = pick_local_ip(addresses, route_interface)
+        return True
+
+    def refresh_disks(self):
+        try:
+            disks = disk_usage()
+        except Exception as e:
+            print(f"Erro ao ler o uso dos discos: {e}")
+            return
+        with self._lock:
+            self._disks = disks
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='host-facts', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Disks are read here first too, `disks` is empty until then
+        self.refresh_disks()
+        while not self._stop.wait(self.poll_interval):
+            self.refresh()
+            self.refresh_disks()
+
+    @property
+    def local_ip(self):
+        with self._lock:
+            return self._local_ip
+
+    @property
+    def addresses(self):
+        with self._lock:
+            return dict(self._addresses)
+
+    @property
+    def disks(self):
+        with self._lock:
+            return list(self._disks)
+
+    def disk_for(self, path):
+        """The disk holding `path`: the mount with the longest matching mountpoint."""
+        path = os.path.realpath(path)
+        best = None
+        for disk in self.disks:
+            mountpoint = disk['mountpoint']
+            try:
+                inside = os.path.commonpath([mountpoint, path]) == mountpoint
+            except ValueError:
+                # Another drive on Windows
+                continue
+            if inside and (best is None or len(mountpoint) > len(best['mountpoint'])):
+                best = disk
+        return best
+
+    def to_dict(self):
+        return {
+            'system': self.system,
+            'hostname': self.hostname,
+            'username': self.username,
+            'cwd': self.cwd,
+            'local_ip': self.local_ip,
+            'addresses': self.addresses,
+        }
+
+
+facts = HostFacts()
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+
+class ProcReader:
+    """Keeps a /proc file open and re-reads it from the start on every call."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def read(self):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'r')
+            try:
+                self._file.seek(0)
+                return self._file.read()
+            except OSError:
+                # The handle went stale (e.g. interface churn), reopen once
+                self._file.close()
+                self._file = open(self.path, 'r')
+                return self._file.read()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class HostMetricsCollector:
+    """
+    Reads memory, Wi-Fi and network counters straight from /proc.
+
+    Nothing here forks a process, so it is safe to call from request handlers
+    and from the background sampler.
+    """
+
+    def __init__(self, proc_root='/proc'):
+        self._meminfo = ProcReader(os.path.join(proc_root, 'meminfo'))
+        self._wireless = ProcReader(os.path.join(proc_root, 'net', 'wireless'))
+        self._netdev = ProcReader(os.path.join(proc_root, 'net', 'dev'))
+        self._lock = threading.Lock()
+        self._last_counters = None
+        self._last_time = None
+
+    def memory(self):
+        """Returns total/available/used in kB and the used percentage."""
+        values = {}
+        for line in self._meminfo.read().splitlines():
+            key, _, rest = line.partition(':')
+            fields = rest.split()
+            if fields:
+                values[key] = int(fields[0])
+        total = values.get('MemTotal', 0)
+        # MemAvailable is missing on very old kernels
+        available = values.get('MemAvailable',
+                               values.get('MemFree', 0) + values.get('Buffers', 0) + values.get('Cached', 0))
+        used = total - available
+        return {
+            'total': total,
+            'available': available,
+            'used': used,
+            'percent': round(used / total * 100, 2) if total else 0.0,
+        }
+
+    def wifi(self):
+        """
+        Returns {interface: {'link': ..., 'level': ..., 'quality': percent}}.
+
+        Link quality in /proc/net/wireless is reported out of 70 by most drivers.
+        """
+        interfaces = {}
+        try:
+            content = self._wireless.read()
+        except FileNotFoundError:
+            return interfaces
+        # The first two lines are headers
+        for line in content.splitlines()[2:]:
+            name, _, rest = line.partition(':')
+            fields = rest.split()
+            if len(fields) < 3:
+                continue
+            link = float(fields[1].rstrip('.'))
+            level = float(fields[2].rstrip('.'))
+            interfaces[name.strip()] = {
+                'link': link,
+                'level': level,
+                'quality': round(min(link / 70 * 100, 100), 2),
+            }
+        return interfaces
+
+    def wifi_signal(self):
+        """Returns the best link quality percentage, or None without a wireless interface."""
+        qualities = [interface['quality'] for interface in self.wifi().values()]
+        return max(qualities) if qualities else None
+
+    def network_counters(self):
+        """Returns {interface: (rx_bytes, tx_bytes)} from /proc/net/dev."""
+        counters = {}
+        for line in self._netdev.read().splitlines()[2:]:
+            name, _, rest = line.partition(':')
+            fields = rest.split()
+            if len(fields) < 9:
+                continue
+            counters[name.strip()] = (int(fields[0]), int(fields[8]))
+        return counters
+
+    def network_rates(self):
+        """
+        Returns {interface: {'rx': bytes/s, 'tx': bytes/s}} since the previous call.
+
+        The first call only records a baseline and returns zero rates.
+        """
+        counters = self.network_counters()
+        now = time.monotonic()
+        with self._lock:
+            last_counters, last_time = self._last_counters, self._last_time
+            self._last_counters, self._last_time = counters, now
+        rates = {}
+        elapsed = now - last_time if last_time else 0
+        for name, (rx, tx) in counters.items():
+            if not last_counters or name not in last_counters or elapsed <= 0:
+                rates[name] = {'rx': 0.0, 'tx': 0.0}
+                continue
+            last_rx, last_tx = last_counters[name]
+            # Counters reset when an interface goes down and comes back
+            rates[name] = {
+                'rx': round(max(rx - last_rx, 0) / elapsed, 2),
+                'tx': round(max(tx - last_tx, 0) / elapsed, 2),
+            }
+        return rates
+
+    def close(self):
+        for reader in (self._meminfo, self._wireless, self._netdev):
+            reader.close()
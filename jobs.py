@@ -0,0 +1,166 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting to run."""
+
+
+class Job:
+    """State and output of one background job, safe to read from request threads."""
+
+    def __init__(self, name, max_lines):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.state = 'queued'
+        self.step = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = None
+        self._progress_changes = 0
+        self._progress_notified = 0.0
+        self.max_lines = max_lines
+        self._lines = []
+        self._dropped = 0
+        self._condition = threading.Condition()
+
+    def log(self, line):
+        with self._condition:
+            self._lines.append(line.rstrip('\n'))
+            if len(self._lines) > self.max_lines:
+                # Keep line numbers stable for clients polling with `since`
+                del self._lines[0]
+                self._dropped += 1
+            self._condition.notify_all()
+
+    def set_step(self, step):
+        with self._condition:
+            self.step = step
+            self.log(f"==> {step}")
+
+    def set_progress(self, done, total):
+        """Records `done` out of `total` units (bytes, files...) for the progress bar."""
+        with self._condition:
+            self.progress = (done, total)
+            # Wake long-polling clients a few times a second, not on every chunk
+            now = time.monotonic()
+            if done >= total or now - self._progress_notified >= 0.5:
+                self._progress_notified = now
+                self._progress_changes += 1
+                self._condition.notify_all()
+
+    def _set_state(self, state, error=None):
+        with self._condition:
+            self.state = state
+            self.error = error
+            if state == 'running':
+                self.started_at = time.time()
+            elif state in ('succeeded', 'failed'):
+                self.finished_at = time.time()
+            self._condition.notify_all()
+
+    @property
+    def done(self):
+        return self.state in ('succeeded', 'failed')
+
+    def lines_since(self, since=0):
+        """Returns (lines, next_since) counting from the first line ever logged."""
+        with self._condition:
+            start = max(since - self._dropped, 0)
+            return self._lines[start:], self._dropped + len(self._lines)
+
+    def wait(self, since, timeout):
+        """Blocks until there is output past `since` or new progress, the job finishes or `timeout` passes."""
+        with self._condition:
+            changes = self._progress_changes
+            self._condition.wait_for(
+                lambda: self.done or self._dropped + len(self._lines) > since or self._progress_changes != changes,
+                timeout=timeout)
+
+    def to_dict(self, since=0):
+        lines, next_since = self.lines_since(since)
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'step': self.step,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': {'done': self.progress[0], 'total': self.progress[1]} if self.progress else None,
+            'lines': lines,
+            'next_since': next_since,
+        }
+
+
+class JobRunner:
+    """
+    Runs long installs on a bounded worker pool instead of inside requests.
+
+    Args:
+        workers (int): Jobs running at the same time.
+        max_pending (int): Jobs allowed to wait for a worker before submit() refuses.
+        max_lines (int): Output lines kept per job.
+        keep_finished (int): Finished jobs kept around for clients to re-attach to.
+    """
+
+    def __init__(self, workers=2, max_pending=10, max_lines=5000, keep_finished=50):
+        self.max_pending = max_pending
+        self.max_lines = max_lines
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name, function, *args, **kwargs):
+        """
+        Queues function(job, *args, **kwargs) and returns the Job right away.
+
+        The function reports progress through job.set_step() and job.log().
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.state == 'queued')
+            if pending >= self.max_pending:
+                raise QueueFull("Too many jobs waiting, try again later")
+            job = Job(name, self.max_lines)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        job._set_state('running')
+        try:
+            function(job, *args, **kwargs)
+        except Exception as e:
+            job.log(traceback.format_exc())
+            job._set_state('failed', error=str(e))
+        else:
+            job._set_state('succeeded')
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find_active(self, name):
+        """Returns the queued or running job called `name`, so a second submit can re-attach."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.name == name and not job.done:
+                    return job
+        return None
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,209 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+MIN_COST = 10
+MAX_COST = 16
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash timed out, the caller should retry later."""
+
+
+class TooManyAttempts(Exception):
+    """Raised when an IP or username is in its login backoff window."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed attempts, try again in {int(retry_after) + 1}s")
+        self.retry_after = retry_after
+
+
+def _hash(password, cost):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=cost))
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_cost(hashed):
+    """Returns the cost factor stored in a bcrypt hash ($2b$12$...), or None."""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+def calibrate_cost(target_ms=250, min_cost=MIN_COST, max_cost=MAX_COST):
+    """Returns the highest cost whose hash takes no longer than `target_ms` on this machine."""
+    cost = min_cost
+    started = time.perf_counter()
+    _hash(b'calibration', cost)
+    elapsed = (time.perf_counter() - started) * 1000
+    # Every extra round doubles the time
+    while cost < max_cost and elapsed * 2 <= target_ms:
+        cost += 1
+        elapsed *= 2
+    return cost
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification on a bounded process pool.
+
+    Request threads hand the work to worker processes, so a burst of logins
+    cannot hold the GIL or every request thread. At most `max_queue` hashes
+    may be running or waiting, counting ones whose caller timed out;
+    beyond that HasherBusy is raised instead of queueing, and also when a
+    result takes longer than `timeout`. Workers are started with forkserver
+    (spawn where it is missing), never forked from the threaded server.
+
+    The calibrated cost can differ a little between processes and restarts,
+    so only hashes below it are upgraded: a password is never rehashed back
+    and forth between two neighbouring costs.
+
+    Args:
+        workers (int): Worker processes.
+        max_queue (int): Hashes running or waiting at the same time.
+        cost (int): bcrypt cost; calibrated to `target_ms` when None.
+        target_ms (float): Hash time aimed for by the calibration.
+        timeout (float): Seconds a caller waits for its result.
+    """
+
+    def __init__(self, workers=2, max_queue=16, cost=None, target_ms=250, timeout=30):
+        self.workers = workers
+        self.target_ms = target_ms
+        self.timeout = timeout
+        self._cost = cost
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def cost(self):
+        if self._cost is None:
+            with self._lock:
+                if self._cost is None:
+                    self._cost = calibrate_cost(self.target_ms)
+        return self._cost
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Forking a worker full of request threads can copy a held lock into the child
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(method))
+            return self._executor
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Password hashing queue is full")
+        try:
+            future = self._pool().submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the hash finishes, even if the caller gave up waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy("Password hashing is taking too long, try again")
+
+    def hash(self, password):
+        return self._run(_hash, password.encode('utf-8'), self.cost).decode('utf-8')
+
+    def verify(self, password, hashed):
+        return self._run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        cost = hash_cost(hashed)
+        return cost is None or cost < self.cost
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+class LoginThrottle:
+    """
+    Exponential backoff per IP and per username after failed logins.
+
+    The first `free_attempts` failures cost nothing. After that each
+    failure doubles the wait, up to `max_delay` seconds. A successful
+    login clears the username and IP.
+    """
+
+    def __init__(self, free_attempts=5, base_delay=1, max_delay=15 * 60, forget_after=3600):
+        self.free_attempts = free_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.forget_after = forget_after
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def check(self, *keys):
+        """Raises TooManyAttempts if any key is still locked out."""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._failures.get(key)
+                if entry and entry['locked_until'] > now:
+                    raise TooManyAttempts(entry['locked_until'] - now)
+
+    def failed(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._failures.get(key)
+                if entry is None or now - entry['last'] > self.forget_after:
+                    entry = {'count': 0, 'locked_until': 0, 'last': now}
+                entry['count'] += 1
+                entry['last'] = now
+                over = entry['count'] - self.free_attempts
+                if over > 0:
+                    entry['locked_until'] = now + min(self.base_delay * 2 ** (over - 1), self.max_delay)
+                self._failures[key] = entry
+            if len(self._failures) > 10000:
+                self._forget_old(now)
+
+    def succeeded(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+    def _forget_old(self, now):
+        for key, entry in list(self._failures.items()):
+            if now - entry['last'] > self.forget_after and entry['locked_until'] <= now:
+                del self._failures[key]
+
+
+def benchmark(costs=range(MIN_COST, 14), seconds=2.0, workers=None):
+    """Prints hashes per second for each cost, on one core and on the pool."""
+    workers = workers or os.cpu_count() or 1
+    print(f"Calibrated cost for 250 ms: {calibrate_cost(250)}")
+    for cost in costs:
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            _hash(b'benchmark', cost)
+            count += 1
+        single = count / (time.perf_counter() - started)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = max(workers * 2, int(single * seconds * workers))
+            started = time.perf_counter()
+            list(executor.map(_hash, [b'benchmark'] * jobs, [cost] * jobs))
+            pooled = jobs / (time.perf_counter() - started)
+        print(f"cost {cost:2d}: {single:8.2f} hashes/s on one core, {pooled:8.2f} hashes/s on {workers} workers")
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import deque
+
+import psutil
+
+
+class MetricsSampler:
+    """
+    Samples CPU, RAM and per-core load on a background thread.
+
+    Samples are kept in a ring buffer so the latest value and recent history
+    can be read without waiting on psutil inside a request.
+
+    Args:
+        interval (float): Seconds between samples.
+        history_seconds (float): How much history the ring buffer holds.
+        collector (HostMetricsCollector): Optional /proc reader used for RAM and
+            per-interface network rates instead of psutil.
+    """
+
+    def __init__(self, interval=2.0, history_seconds=3600, collector=None):
+        self.interval = interval
+        self.collector = collector
+        self._samples = deque(maxlen=max(1, int(history_seconds / interval)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        # Prime psutil so the first non-blocking read is measured against now
+        psutil.cpu_percent(interval=None, percpu=True)
+        if self.collector:
+            self.collector.network_rates()
+        self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._record()
+            except Exception as e:
+                print(f"Metrics sampler error: {e}")
+
+    def _record(self):
+        per_core = psutil.cpu_percent(interval=None, percpu=True)
+        if self.collector:
+            ram = self.collector.memory()['percent']
+            net = self.collector.network_rates()
+        else:
+            ram = round(psutil.virtual_memory().percent, 2)
+            net = {}
+        sample = {
+            'time': time.time(),
+            'cpu': round(sum(per_core) / len(per_core), 2) if per_core else 0.0,
+            'ram': ram,
+            'per_core': [round(core, 2) for core in per_core],
+            'net': net,
+        }
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def latest(self):
+        """Returns the most recent sample, or None before the first one is taken."""
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def history(self, seconds=None):
+        """Returns the samples from the last `seconds` seconds, oldest first."""
+        with self._lock:
+            samples = list(self._samples)
+        if seconds is None:
+            return samples
+        since = time.time() - seconds
+        return [sample for sample in samples if sample['time'] >= since]
@@ -0,0 +1,218 @@
+import os
+import sqlite3
+import threading
+
+BATCH_SIZE = 1000
+
+
+class FileSearchIndex:
+    """
+    Persistent filename index of everything under the upload folder.
+
+    Paths are stored relative to `root` in an SQLite database with an index
+    on the lowercase name for prefix queries and an FTS5 trigram table for
+    substring queries, so neither has to scan every row. The index is kept
+    current by update_path()/remove_path(), called from the file routes and
+    from the filesystem watcher, and only rebuilt from scratch when the
+    database does not exist yet.
+
+    Args:
+        db_path (str): Where the SQLite database lives (outside `root`).
+        root (str): Folder being indexed.
+        excluded (set): Entry names that are never indexed.
+    """
+
+    def __init__(self, db_path, root, excluded=()):
+        self.db_path = db_path
+        self.root = os.path.abspath(root)
+        self.excluded = set(excluded)
+        self._lock = threading.Lock()
+        self._connection = None
+        self.has_trigram = False
+        self.ready = threading.Event()
+
+    def open(self):
+        """Opens the database, rebuilding it in the background if it is new."""
+        is_new = not os.path.exists(self.db_path)
+        self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        if is_new:
+            threading.Thread(target=self.rebuild, name='search-index-rebuild', daemon=True).start()
+        else:
+            self.ready.set()
+
+    def _create_schema(self):
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    name TEXT NOT NULL,
+                    name_lower TEXT NOT NULL,
+                    extension TEXT NOT NULL,
+                    is_dir INTEGER NOT NULL,
+                    size INTEGER,
+                    mtime REAL
+                )
+            """)
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_files_name_lower ON files (name_lower)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS idx_files_extension ON files (extension)")
+            try:
+                self._connection.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS files_trigram
+                    USING fts5(name_lower, content='files', content_rowid='id', tokenize='trigram')
+                """)
+                self._connection.executescript("""
+                    CREATE TRIGGER IF NOT EXISTS files_trigram_insert AFTER INSERT ON files BEGIN
+                        INSERT INTO files_trigram (rowid, name_lower) VALUES (new.id, new.name_lower);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_trigram_delete AFTER DELETE ON files BEGIN
+                        INSERT INTO files_trigram (files_trigram, rowid, name_lower) VALUES ('delete', old.id, old.name_lower);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_trigram_update AFTER UPDATE OF name_lower ON files BEGIN
+                        INSERT INTO files_trigram (files_trigram, rowid, name_lower) VALUES ('delete', old.id, old.name_lower);
+                        INSERT INTO files_trigram (rowid, name_lower) VALUES (new.id, new.name_lower);
+                    END;
+                """)
+                self.has_trigram = True
+            except sqlite3.OperationalError:
+                # SQLite older than 3.34 has no trigram tokenizer, substring search falls back to LIKE
+                self.has_trigram = False
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, '/')
+
+    def _is_excluded(self, relative_path):
+        return any(part in self.excluded for part in relative_path.split('/'))
+
+    def _row(self, relative_path, is_dir, size, mtime):
+        name = relative_path.rsplit('/', 1)[-1]
+        extension = '' if is_dir else os.path.splitext(name)[1].lower()
+        return (relative_path, name, name.lower(), extension, int(is_dir), size, mtime)
+
+    def _walk(self, path):
+        """Yields index rows for `path` and everything below it."""
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as iterator:
+                    for entry in iterator:
+                        if entry.name in self.excluded:
+                            continue
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        yield self._row(self._relative(entry.path), is_dir,
+                                        None if is_dir else stat.st_size, stat.st_mtime)
+                        if is_dir:
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def _upsert(self, rows):
+        self._connection.executemany("""
+            INSERT INTO files (path, name, name_lower, extension, is_dir, size, mtime)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, is_dir = excluded.is_dir
+        """, rows)
+
+    def rebuild(self):
+        """Re-indexes the whole tree, committing in batches."""
+        self.ready.clear()
+        try:
+            with self._lock, self._connection:
+                self._connection.execute("DELETE FROM files")
+            batch = []
+            for row in self._walk(self.root):
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    with self._lock, self._connection:
+                        self._upsert(batch)
+                    batch = []
+            with self._lock, self._connection:
+                self._upsert(batch)
+        finally:
+            self.ready.set()
+
+    def update_path(self, path):
+        """Indexes a new or changed file, or a folder together with its contents."""
+        relative_path = self._relative(path)
+        if relative_path.startswith('..') or relative_path == '.' or self._is_excluded(relative_path):
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove_path(path)
+            return
+        is_dir = os.path.isdir(path)
+        rows = [self._row(relative_path, is_dir, None if is_dir else stat.st_size, stat.st_mtime)]
+        if is_dir:
+            rows.extend(self._walk(path))
+        with self._lock, self._connection:
+            self._upsert(rows)
+
+    def remove_path(self, path):
+        """Drops a file, or a folder and everything that was indexed below it."""
+        relative_path = self._relative(path)
+        if relative_path.startswith('..') or relative_path == '.':
+            return
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM files WHERE path = ?", (relative_path,))
+            # Range query instead of LIKE so paths containing % or _ are handled
+            self._connection.execute("DELETE FROM files WHERE path >= ? AND path < ?",
+                                     (relative_path + '/', relative_path + '0'))
+
+    def handle_event(self, event, path, is_dir):
+        """Subscriber for FileSystemWatcher."""
+        if event == 'overflow':
+            threading.Thread(target=self.rebuild, name='search-index-rebuild', daemon=True).start()
+        elif event == 'deleted':
+            self.remove_path(path)
+        else:
+            self.update_path(path)
+
+    def search(self, query, mode='substring', extension=None, limit=50):
+        """
+        Returns matching entries as dicts, folders first then by name.
+
+        mode is 'prefix' (name starts with query) or 'substring' (name contains it).
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        params = []
+        if mode == 'prefix':
+            sql = "SELECT path, name, is_dir, size, mtime FROM files WHERE name_lower >= ? AND name_lower < ?"
+            params += [query, query + '\uffff']
+        elif self.has_trigram and len(query) >= 3:
+            sql = """
+                SELECT path, name, is_dir, size, mtime FROM files
+                WHERE id IN (SELECT rowid FROM files_trigram WHERE files_trigram MATCH ?)
+            """
+            params.append('"' + query.replace('"', '""') + '"')
+        else:
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            sql = "SELECT path, name, is_dir, size, mtime FROM files WHERE name_lower LIKE ? ESCAPE '\\'"
+            params.append('%' + escaped + '%')
+        if extension:
+            sql += " AND extension = ?"
+            params.append(extension.lower() if extension.startswith('.') else '.' + extension.lower())
+        sql += " ORDER BY is_dir DESC, name_lower LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        return [
+            {'path': path, 'name': name, 'is_dir': bool(is_dir), 'size': size, 'mtime': mtime}
+            for path, name, is_dir, size, mtime in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,537 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import metrics
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db.sql')
+
+# Tables added to db.sql after the first release, created on databases that predate them
+ADDED_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS user_trigrams (
+        trigram VARCHAR(3) NOT NULL,
+        user_id INT NOT NULL,
+        PRIMARY KEY (trigram, user_id),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_quotas (
+        user_id INT PRIMARY KEY,
+        folder VARCHAR(255) NOT NULL,
+        max_bytes BIGINT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_preferences (
+        user_id INT PRIMARY KEY,
+        wallpaper_path VARCHAR(255),
+        theme VARCHAR(50),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    )
+    """,
+)
+
+
+class CannotDeleteLastUser(Exception):
+    """Raised when deleting a user would leave nobody able to log in."""
+
+
+def trigrams(text):
+    """Distinct lowercase 3-character slices of `text`, the keys of user_trigrams."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _escape_like(text):
+    return text.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+def _prefix_upper_bound(prefix):
+    # Smallest string greater than every string starting with `prefix`
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class MySQLBackend:
+    """MySQL through the pooled mysql.connector connections of db_pool."""
+
+    name = 'mysql'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @contextmanager
+    def connection(self):
+        with metrics.timed('db_checkout', metrics.db_checkout_seconds):
+            connection = self.pool.get_connection()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def sql(self, statement):
+        return statement
+
+    def ddl(self, statement):
+        return [statement]
+
+    def upsert(self, table, key, columns):
+        placeholders = ', '.join(['%s'] * len(columns))
+        updates = ', '.join(f"{column} = VALUES({column})" for column in columns if column != key)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON DUPLICATE KEY UPDATE {updates}")
+
+    def insert_ignore(self, table, columns):
+        placeholders = ', '.join(['%s'] * len(columns))
+        return f"INSERT IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def stats(self):
+        return dict(self.pool.stats(), backend=self.name)
+
+    def close(self):
+        self.pool.close_all()
+
+
+def mysql_schema_to_sqlite(schema):
+    """
+    Translates the MySQL DDL of db.sql into SQLite statements.
+
+    Only what db.sql uses is handled: AUTO_INCREMENT keys, inline INDEX
+    clauses (turned into CREATE INDEX), ON UPDATE CURRENT_TIMESTAMP (dropped)
+    and the CREATE DATABASE / USE lines (skipped).
+    """
+    schema = re.sub(r'--[^\n]*', '', schema)
+    statements = []
+    for statement in schema.split(';'):
+        statement = statement.strip()
+        if not statement or re.match(r'(CREATE\s+DATABASE|USE)\b', statement, re.IGNORECASE):
+            continue
+        table = re.match(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', statement, re.IGNORECASE)
+        if not table:
+            statements.append(statement)
+            continue
+        indexes = []
+        lines = []
+        for line in statement.splitlines():
+            index = re.match(r'\s*(?:INDEX|KEY)\s+(\w+)\s*(\([^)]*\))', line, re.IGNORECASE)
+            if index:
+                indexes.append(f"CREATE INDEX IF NOT EXISTS {index.group(1)} ON {table.group(1)} {index.group(2)}")
+                continue
+            line = re.sub(r'\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT', line,
+                          flags=re.IGNORECASE)
+            line = re.sub(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP', '', line, flags=re.IGNORECASE)
+            lines.append(line)
+        body = '\n'.join(lines)
+        # Removing an INDEX line can leave a dangling comma before the closing parenthesis
+        body = re.sub(r',\s*\)\s*$', '\n)', body)
+        body = re.sub(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?', 'CREATE TABLE IF NOT EXISTS ', body, count=1,
+                      flags=re.IGNORECASE)
+        statements.append(body)
+        statements.extend(indexes)
+    return statements
+
+
+class SQLiteBackend:
+    """
+    Embedded SQLite database, no server process needed.
+
+    Runs in WAL mode so the background writers never block readers, with
+    one connection per thread. The schema is created from db.sql the first
+    time the file is opened.
+
+    Args:
+        path (str): Database file.
+        schema_path (str): MySQL schema translated on first use.
+        busy_timeout (float): Seconds a writer waits for the write lock.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, schema_path=SCHEMA_PATH, busy_timeout=5.0):
+        self.path = path
+        self.schema_path = schema_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._create_schema()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        with self._lock:
+            self._opened += 1
+        return connection
+
+    def _create_schema(self):
+        connection = self._connect()
+        try:
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone()
+            if exists:
+                return
+            with open(self.schema_path) as f:
+                statements = mysql_schema_to_sqlite(f.read())
+            with connection:
+                for statement in statements:
+                    connection.execute(statement)
+        finally:
+            connection.close()
+
+    @contextmanager
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+
+    def sql(self, statement):
+        return statement.replace('%s', '?')
+
+    def ddl(self, statement):
+        return mysql_schema_to_sqlite(statement)
+
+    def upsert(self, table, key, columns):
+        placeholders = ', '.join(['%s'] * len(columns))
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != key)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT({key}) DO UPDATE SET {updates}")
+
+    def insert_ignore(self, table, columns):
+        placeholders = ', '.join(['%s'] * len(columns))
+        return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def stats(self):
+        with self._lock:
+            return {'backend': self.name, 'path': self.path, 'opened': self._opened}
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def _as_datetime(value):
+    # SQLite hands TIMESTAMP columns back as text
+    if isinstance(value, str):
+        return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _as_timestamp(value):
+    """
+    'YYYY-MM-DD HH:MM:SS' for a datetime or an ISO string, 'T' separator and
+    missing seconds included. SQLite compares TIMESTAMP columns as text, so
+    the datetime-local '2024-05-01T10:30' would sort after every time that day.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class DataStore:
+    """
+    Every query the app makes, written once against a pluggable backend.
+
+    Statements use %s placeholders and are adapted by the backend; each one
+    is timed into the SQL histogram of /metrics.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _execute(self, cursor, statement, params=()):
+        operation, table = metrics.describe_sql(statement)
+        with metrics.timed('sql', metrics.sql_seconds, operation=operation, table=table):
+            cursor.execute(self.backend.sql(statement), params)
+
+    @staticmethod
+    def _rows(cursor):
+        if cursor.description is None:
+            return []
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def _query(self, statement, params=()):
+        with self.backend.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                self._execute(cursor, statement, params)
+                return self._rows(cursor)
+            finally:
+                cursor.close()
+
+    def _query_one(self, statement, params=()):
+        rows = self._query(statement, params)
+        return rows[0] if rows else None
+
+    def _write(self, *statements):
+        """Runs (statement, params) pairs in one transaction."""
+        with self.backend.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for statement, params in statements:
+                    self._execute(cursor, statement, params)
+                connection.commit()
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+    def stats(self):
+        return self.backend.stats()
+
+    def close(self):
+        self.backend.close()
+
+    # Users
+
+    def create_user(self, username, password_hash):
+        with self.backend.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                self._execute(cursor, "INSERT INTO users (username, password) VALUES (%s, %s)",
+                              (username, password_hash))
+                self._index_trigrams(cursor, [(cursor.lastrowid, username)])
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def _index_trigrams(self, cursor, users):
+        rows = [(trigram, user_id) for user_id, username in users for trigram in sorted(trigrams(username))]
+        if rows:
+            with metrics.timed('sql', metrics.sql_seconds, operation='INSERT', table='user_trigrams'):
+                cursor.executemany(self.backend.sql(self.backend.insert_ignore('user_trigrams', ('trigram', 'user_id'))),
+                                   rows)
+
+    def create_added_tables(self):
+        """
+        Creates the tables of ADDED_TABLES this database does not have yet, and
+        gives every user without preferences the last wallpaper and theme they applied.
+        """
+        with self.backend.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for statement in ADDED_TABLES:
+                    for ddl in self.backend.ddl(statement):
+                        cursor.execute(ddl)
+                self._execute(cursor, """
+                    INSERT INTO user_preferences (user_id, wallpaper_path, theme)
+                    SELECT w.user_id, w.wallpaper_path, w.theme FROM wallpapers_and_theme_for_user w
+                    WHERE w.id = (SELECT id FROM wallpapers_and_theme_for_user
+                                  WHERE user_id = w.user_id ORDER BY applied_at DESC, id DESC LIMIT 1)
+                    AND w.user_id NOT IN (SELECT user_id FROM user_preferences)
+                """)
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def index_user_trigrams(self):
+        """Indexes the users missing from user_trigrams, returns how many were looked at."""
+        with self.backend.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                self._execute(cursor, "SELECT id, username FROM users WHERE id NOT IN (SELECT user_id FROM user_trigrams)")
+                users = cursor.fetchall()
+                self._index_trigrams(cursor, users)
+                connection.commit()
+                return len(users)
+            finally:
+                cursor.close()
+
+    def get_user_by_username(self, username):
+        return self._query_one("SELECT * FROM users WHERE username = %s", (username,))
+
+    def search_users(self, query='', after=None, limit=50, substring=False):
+        """
+        One page of users ordered by username, and the `after` key of the next page.
+
+        By default `query` is a prefix, answered as a range scan of the unique
+        username index (compared with the column's collation: case-insensitive
+        on MySQL, exact on SQLite). With `substring` the candidates come from
+        user_trigrams, so a match anywhere in the name does not scan the
+        table either; queries shorter than three characters stay prefixes.
+        Pages are keyset-paginated on username instead of using OFFSET.
+        """
+        join = ""
+        conditions = []
+        params = []
+        grams = sorted(trigrams(query)) if substring else []
+        if grams:
+            placeholders = ', '.join(['%s'] * len(grams))
+            join = f"""
+                JOIN (SELECT user_id FROM user_trigrams WHERE trigram IN ({placeholders})
+                      GROUP BY user_id HAVING COUNT(*) = %s) t ON t.user_id = u.id
+            """
+            params.extend(grams + [len(grams)])
+            # The trigrams only narrow it down, 'abc' and 'bcd' are not 'abcd'
+            conditions.append("u.username LIKE %s ESCAPE '!'")
+            params.append('%' + _escape_like(query) + '%')
+        elif query:
+            conditions.append("u.username >= %s AND u.username < %s")
+            params.extend([query, _prefix_upper_bound(query)])
+        if after is not None:
+            conditions.append("u.username > %s")
+            params.append(after)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        rows = self._query(f"""
+            SELECT u.id, u.username FROM users u
+            {join}
+            {where}
+            ORDER BY u.username
+            LIMIT %s
+        """, params + [limit + 1])
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1]['username']
+        return rows, next_after
+
+    def get_all_users(self):
+        return self._query("SELECT id, username FROM users")
+
+    def delete_user(self, user_id):
+        with self.backend.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                self._execute(cursor, "SELECT COUNT(*) FROM users")
+                if cursor.fetchone()[0] <= 1:
+                    raise CannotDeleteLastUser("Cannot delete the last remaining user.")
+                self._execute(cursor, "DELETE FROM users WHERE id = %s", (user_id,))
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def update_user_password(self, user_id, password_hash):
+        self._write(("UPDATE users SET password = %s WHERE id = %s", (password_hash, user_id)))
+
+    # Storage quotas
+
+    def list_quotas(self):
+        return self._query("""
+            SELECT q.user_id, u.username, q.folder, q.max_bytes
+            FROM user_quotas q JOIN users u ON u.id = q.user_id
+            ORDER BY u.username
+        """)
+
+    def set_quota(self, user_id, folder, max_bytes):
+        self._write((self.backend.upsert('user_quotas', 'user_id', ('user_id', 'folder', 'max_bytes')),
+                     (user_id, folder, max_bytes)))
+
+    def delete_quota(self, user_id):
+        self._write(("DELETE FROM user_quotas WHERE user_id = %s", (user_id,)))
+
+    # Wallpaper and theme
+
+    def apply_wallpaper_and_theme(self, user_id, wallpaper_path, theme):
+        # Keep the full history, but the current choice lives in user_preferences
+        self._write(
+            ("INSERT INTO wallpapers_and_theme_for_user (user_id, wallpaper_path, theme) VALUES (%s, %s, %s)",
+             (user_id, wallpaper_path, theme)),
+            (self.backend.upsert('user_preferences', 'user_id', ('user_id', 'wallpaper_path', 'theme')),
+             (user_id, wallpaper_path, theme)),
+        )
+
+    def get_last_applied_wallpaper_and_theme(self, user_id):
+        return self._query_one("""
+            SELECT * FROM wallpapers_and_theme_for_user
+            WHERE user_id = %s ORDER BY applied_at DESC, id DESC LIMIT 1
+        """, (user_id,))
+
+    def get_preferences(self, user_id):
+        return self._query_one("SELECT wallpaper_path, theme FROM user_preferences WHERE user_id = %s", (user_id,))
+
+    # Access log
+
+    def insert_access(self, events):
+        """Inserts (user_id, access_level, ip_address, os_name, user_agent, created_at) tuples."""
+        if not events:
+            return
+        with self.backend.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                statement = """
+                    INSERT INTO access (user_id, access_level, ip_address, os_name, user_agent, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """
+                with metrics.timed('sql', metrics.sql_seconds, operation='INSERT', table='access'):
+                    # mysql.connector folds this into one multi-row INSERT
+                    cursor.executemany(self.backend.sql(statement), list(events))
+                connection.commit()
+            finally:
+                cursor.close()
+
+    def access_history(self, user_id=None, since=None, until=None, before=None, limit=50):
+        """
+        Up to `limit` access rows newest first, using idx_access_user_created.
+
+        `before` is the (created_at, id) of the last row of the previous page, so
+        each page is a range scan on the index instead of an OFFSET. Times may
+        be datetimes or ISO strings; an unparseable one raises ValueError.
+        """
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append("a.user_id = %s")
+            params.append(user_id)
+        if since:
+            conditions.append("a.created_at >= %s")
+            params.append(_as_timestamp(since))
+        if until:
+            conditions.append("a.created_at < %s")
+            params.append(_as_timestamp(until))
+        if before:
+            before_time = _as_timestamp(before[0])
+            conditions.append("(a.created_at < %s OR (a.created_at = %s AND a.id < %s))")
+            params.extend([before_time, before_time, before[1]])
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        rows = self._query(f"""
+            SELECT a.id, a.user_id, u.username, a.access_level, a.ip_address, a.os_name, a.user_agent, a.created_at
+            FROM access a LEFT JOIN users u ON u.id = a.user_id
+            {where}
+            ORDER BY a.created_at DESC, a.id DESC
+            LIMIT %s
+        """, params + [limit])
+        for row in rows:
+            row['created_at'] = _as_datetime(row['created_at'])
+        return rows
+
+    # Docker containers
+
+    def list_docker_containers(self):
+        return self._query("SELECT name, port, installed, icon FROM docker_containers")
+
+    def set_container_installed(self, name, installed=True):
+        self._write(("UPDATE docker_containers SET installed = %s WHERE name = %s", (installed, name)))
+
+    def delete_docker_container(self, name):
+        self._write(("DELETE FROM docker_containers WHERE name = %s", (name,)))
+
+
+def open_store(backend='mysql', sqlite_path='homefusion.db', pool_options=None, **connect_args):
+    """
+    Returns a DataStore on the configured backend.
+
+    'sqlite' keeps everything in `sqlite_path`; 'mysql' opens a connection
+    pool with `pool_options` (size, max_overflow, timeout, recycle) and the
+    mysql.connector `connect_args`.
+    """
+    if backend == 'sqlite':
+        return DataStore(SQLiteBackend(sqlite_path))
+    if backend == 'mysql':
+        # Imported here so SQLite installs do not need mysql-connector
+        import db_pool
+        return DataStore(MySQLBackend(db_pool.ConnectionPool(**(pool_options or {}), **connect_args)))
+    raise ValueError(f"Unknown storage backend: {backend}")
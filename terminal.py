@@ -0,0 +1,257 @@
+import os
+import signal
+import struct
+import subprocess
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+    import pty
+    import termios
+except ImportError:
+    # Windows has no PTYs, prompt() falls back to one-shot commands there
+    pty = None
+
+READ_SIZE = 64 * 1024
+
+
+def pty_available():
+    return pty is not None
+
+
+class TerminalSession:
+    """
+    A shell running on its own pseudo-terminal.
+
+    Output is read by a background thread into a bounded scrollback buffer.
+    Offsets count every byte ever produced, so a client that reconnects
+    with its last offset only gets what it missed (or the oldest byte still
+    buffered if it fell too far behind).
+    """
+
+    def __init__(self, shell, cwd, scrollback, env=None):
+        self.id = uuid.uuid4().hex
+        self.scrollback = scrollback
+        self.created_at = time.monotonic()
+        self.last_activity = self.created_at
+        self._buffer = bytearray()
+        self._start = 0
+        self._condition = threading.Condition()
+        self._stream_token = 0
+        self.closed = False
+        self.exit_code = None
+
+        master, slave = pty.openpty()
+        self._master = master
+        self._process = subprocess.Popen(
+            [shell], stdin=slave, stdout=slave, stderr=slave, cwd=cwd,
+            env=dict(env or os.environ, TERM='xterm-256color'),
+            start_new_session=True, close_fds=True)
+        os.close(slave)
+        self._reader = threading.Thread(target=self._read_loop, name=f'pty-{self.id[:8]}', daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        while True:
+            try:
+                data = os.read(self._master, READ_SIZE)
+            except OSError:
+                break
+            if not data:
+                break
+            with self._condition:
+                self._buffer += data
+                overflow = len(self._buffer) - self.scrollback
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self._start += overflow
+                self._condition.notify_all()
+        self.exit_code = self._process.wait()
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+        try:
+            os.close(self._master)
+        except OSError:
+            pass
+
+    @property
+    def end(self):
+        with self._condition:
+            return self._start + len(self._buffer)
+
+    def attach(self):
+        """Starts a new output stream and returns its token, the previous stream is told to stop."""
+        with self._condition:
+            self._stream_token += 1
+            self._condition.notify_all()
+            return self._stream_token
+
+    def superseded(self, token):
+        with self._condition:
+            return token != self._stream_token
+
+    def read(self, offset, timeout=None, token=None):
+        """
+        Returns (data, next_offset) after `offset`, waiting up to `timeout` for new output.
+
+        Returns (b'', offset) on timeout, when the session has closed and when
+        the stream holding `token` has been superseded.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.closed or self._start + len(self._buffer) > offset
+                or (token is not None and token != self._stream_token), timeout=timeout)
+            offset = max(offset, self._start)
+            data = bytes(self._buffer[offset - self._start:])
+            return data, offset + len(data)
+
+    def write(self, data):
+        self.last_activity = time.monotonic()
+        if self.closed:
+            return
+        os.write(self._master, data)
+
+    def resize(self, rows, cols):
+        self.last_activity = time.monotonic()
+        if not self.closed:
+            fcntl.ioctl(self._master, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def terminate(self):
+        if self._process.poll() is None:
+            try:
+                # The shell leads its own process group, take its children down too
+                os.killpg(self._process.pid, signal.SIGHUP)
+            except (ProcessLookupError, PermissionError):
+                pass
+            try:
+                self._process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(self._process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+
+class SessionLimit(Exception):
+    """Raised when the maximum number of terminal sessions is already open."""
+
+
+class StreamLimit(Exception):
+    """Raised when the maximum number of terminal output streams is already open."""
+
+
+class TerminalManager:
+    """
+    Owns every terminal session and enforces the limits.
+
+    Args:
+        shell (str): Program started on each PTY.
+        max_sessions (int): Sessions open at the same time.
+        scrollback (int): Bytes of output kept per session.
+        idle_timeout (float): Seconds without input or a connected reader before a session is closed.
+        max_runtime (float): Seconds a session may live at all.
+        max_streams (int): Output streams open at the same time, each holds a request thread.
+        max_streams_per_owner (int): Output streams one owner may have open.
+    """
+
+    def __init__(self, shell=None, cwd=None, max_sessions=4, scrollback=256 * 1024,
+                 idle_timeout=15 * 60, max_runtime=4 * 3600, max_streams=4, max_streams_per_owner=2):
+        self.shell = shell or os.environ.get('SHELL', '/bin/bash')
+        self.cwd = cwd or os.getcwd()
+        self.max_sessions = max_sessions
+        self.scrollback = scrollback
+        self.idle_timeout = idle_timeout
+        self.max_runtime = max_runtime
+        self.max_streams = max_streams
+        self.max_streams_per_owner = max_streams_per_owner
+        self._sessions = {}
+        # (session id, stream token) -> owner of every open output stream
+        self._streams = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def start(self):
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name='terminal-reaper', daemon=True)
+        self._reaper.start()
+
+    def create(self, owner):
+        with self._lock:
+            self._reap_locked()
+            if len(self._sessions) >= self.max_sessions:
+                raise SessionLimit("Too many terminal sessions open")
+            session = TerminalSession(self.shell, self.cwd, self.scrollback)
+            self._sessions[session.id] = session
+            self._owners[session.id] = owner
+        return session
+
+    def get(self, session_id, owner):
+        """Returns the session if it exists and belongs to `owner`."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or self._owners.get(session_id) != owner:
+                return None
+            return session
+
+    def open_stream(self, session, owner):
+        """
+        Registers an output stream for `session` and returns its token.
+        A stream reopened for the same session replaces the old one instead
+        of counting twice.
+        """
+        with self._lock:
+            others = [stream_owner for (session_id, _), stream_owner in self._streams.items()
+                      if session_id != session.id]
+            if len(others) >= self.max_streams:
+                raise StreamLimit("Too many terminals streaming, close one first")
+            if others.count(owner) >= self.max_streams_per_owner:
+                raise StreamLimit("Too many of your terminals are open, close one first")
+            token = session.attach()
+            self._streams[(session.id, token)] = owner
+        return token
+
+    def close_stream(self, session, token):
+        with self._lock:
+            self._streams.pop((session.id, token), None)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            self._owners.pop(session_id, None)
+        if session:
+            session.terminate()
+
+    def _reap_locked(self):
+        now = time.monotonic()
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if session.closed
+            or now - session.last_activity > self.idle_timeout
+            or now - session.created_at > self.max_runtime
+        ]
+        for session_id in expired:
+            session = self._sessions.pop(session_id)
+            self._owners.pop(session_id, None)
+            threading.Thread(target=session.terminate, daemon=True).start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(30)
+            with self._lock:
+                self._reap_locked()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._owners.clear()
+        for session in sessions:
+            session.terminate()
@@ -0,0 +1,280 @@
+import json
+import queue
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+import pytest
+
+import dockers
+
+
+class FakeEngine:
+    """
+    Just enough of the Docker Engine API, served on a unix socket, for
+    DockerEngine: ping, the container list, container inspect and the
+    events stream. Tests change `containers` and push events with emit().
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.containers = {}
+        self._streams = []
+        self._lock = threading.Lock()
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                path = re.sub(r'^/v[\d.]+', '', urlsplit(self.path).path)
+                if path == '/_ping':
+                    return self._send(200, b'OK', 'text/plain')
+                if path == '/version':
+                    return self._send_json(200, {'ApiVersion': '1.43', 'Version': '24.0.0'})
+                if path == '/containers/json':
+                    with engine._lock:
+                        listed = [{'Id': info['Id'], 'Names': [info['Name']]} for info in engine.containers.values()]
+                    return self._send_json(200, listed)
+                match = re.fullmatch(r'/containers/([^/]+)/json', path)
+                if match:
+                    info = engine.find(match.group(1))
+                    if info is None:
+                        return self._send_json(404, {'message': f"No such container: {match.group(1)}"})
+                    return self._send_json(200, info)
+                if path == '/events':
+                    return self._stream_events()
+                self._send_json(404, {'message': 'page not found'})
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, status, data):
+                self._send(status, json.dumps(data).encode('utf-8'), 'application/json')
+
+            def _stream_events(self):
+                events = queue.Queue()
+                with engine._lock:
+                    engine._streams.append(events)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                self.wfile.flush()
+                while True:
+                    event = events.get()
+                    if event is None:
+                        self.wfile.write(b'0\r\n\r\n')
+                        self.wfile.flush()
+                        self.close_connection = True
+                        return
+                    data = json.dumps(event).encode('utf-8') + b'\n'
+                    self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+            def get_request(self):
+                request, _ = super().get_request()
+                # BaseHTTPRequestHandler expects a (host, port) client address
+                return request, ('fake', 0)
+
+        self.server = Server(socket_path, Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self.end_streams()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def find(self, name_or_id):
+        with self._lock:
+            for info in self.containers.values():
+                if name_or_id in (info['Id'], info['Name'].lstrip('/')):
+                    return info
+        return None
+
+    def add(self, container_id, name, status='running', image='nginx', ports=None):
+        with self._lock:
+            self.containers[container_id] = {
+                'Id': container_id,
+                'Name': '/' + name,
+                'State': {'Status': status},
+                'Config': {'Image': image},
+                'NetworkSettings': {'Ports': ports or {}},
+            }
+
+    def remove(self, container_id):
+        with self._lock:
+            self.containers.pop(container_id, None)
+
+    def emit(self, action, container_id):
+        with self._lock:
+            streams = list(self._streams)
+        for events in streams:
+            events.put({'Type': 'container', 'Action': action, 'id': container_id,
+                        'Actor': {'ID': container_id}, 'time': int(time.time())})
+
+    def end_streams(self):
+        with self._lock:
+            streams, self._streams = self._streams, []
+        for events in streams:
+            events.put(None)
+
+    def stream_count(self):
+        with self._lock:
+            return len(self._streams)
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.fixture
+def fake_engine(tmp_path):
+    engine = FakeEngine(str(tmp_path / 'docker.sock'))
+    engine.start()
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def docker_engine(fake_engine):
+    engine = dockers.DockerEngine(base_url=f"unix://{fake_engine.socket_path}")
+    yield engine
+    engine.stop()
+
+
+def test_sync_reads_every_container(fake_engine, docker_engine):
+    fake_engine.add('a1', 'pihole', ports={'80/tcp': [{'HostIp': '0.0.0.0', 'HostPort': '8090'}], '53/udp': None})
+    fake_engine.add('b2', 'ollama', status='exited', image='ollama/ollama')
+
+    docker_engine.client = docker_engine._connect()
+    docker_engine._sync()
+
+    assert docker_engine.get('pihole') == {'id': 'a1', 'name': 'pihole', 'image': 'nginx',
+                                           'status': 'running', 'ports': {'80/tcp': ['8090']}}
+    assert docker_engine.get('ollama')['status'] == 'exited'
+    assert sorted(info['name'] for info in docker_engine.list()) == ['ollama', 'pihole']
+
+
+def test_refresh_updates_renames_and_forgets(fake_engine, docker_engine):
+    fake_engine.add('a1', 'pihole')
+    docker_engine.client = docker_engine._connect()
+    docker_engine._sync()
+
+    fake_engine.containers['a1']['State']['Status'] = 'exited'
+    docker_engine._refresh('a1')
+    assert docker_engine.get('pihole')['status'] == 'exited'
+
+    fake_engine.containers['a1']['Name'] = '/dns'
+    docker_engine._refresh('a1')
+    assert docker_engine.get('pihole') is None
+    assert docker_engine.get('dns')['id'] == 'a1'
+
+    fake_engine.remove('a1')
+    docker_engine._refresh('a1')
+    assert docker_engine.list() == []
+
+
+def test_events_keep_the_table_current(fake_engine, docker_engine):
+    fake_engine.add('a1', 'pihole')
+    docker_engine.start()
+    assert wait_until(lambda: docker_engine.available and fake_engine.stream_count() == 1)
+    assert docker_engine.get('pihole')['status'] == 'running'
+
+    fake_engine.add('b2', 'ollama', status='created')
+    fake_engine.emit('create', 'b2')
+    assert wait_until(lambda: docker_engine.get('ollama') is not None)
+
+    fake_engine.containers['a1']['State']['Status'] = 'exited'
+    fake_engine.emit('die', 'a1')
+    assert wait_until(lambda: docker_engine.get('pihole')['status'] == 'exited')
+
+    # Actions outside EVENTS are ignored, health_status carries a suffix
+    fake_engine.containers['b2']['State']['Status'] = 'running'
+    fake_engine.emit('exec_start: sh', 'b2')
+    fake_engine.emit('health_status: healthy', 'a1')
+    assert wait_until(lambda: docker_engine.get('pihole')['status'] == 'exited')
+    assert docker_engine.get('ollama')['status'] == 'created'
+
+    fake_engine.remove('b2')
+    fake_engine.emit('destroy', 'b2')
+    assert wait_until(lambda: docker_engine.get('ollama') is None)
+
+
+def test_reconnects_and_resynchronises(fake_engine, docker_engine):
+    fake_engine.add('a1', 'pihole')
+    docker_engine.start()
+    assert wait_until(lambda: docker_engine.available and fake_engine.stream_count() == 1)
+
+    # A container created while the events stream is down, with no event for it
+    fake_engine.end_streams()
+    fake_engine.add('b2', 'ollama')
+    assert wait_until(lambda: docker_engine.get('ollama') is not None)
+    assert wait_until(lambda: docker_engine.available)
+
+
+def test_unreachable_engine_is_not_available(tmp_path):
+    engine = dockers.DockerEngine(base_url=f"unix://{tmp_path / 'missing.sock'}")
+    engine.start()
+    time.sleep(0.2)
+    assert not engine.available
+    assert engine.get('pihole') is None
+    engine.stop()
+
+
+def test_container_exists_uses_the_engine_table(fake_engine, docker_engine, monkeypatch):
+    monkeypatch.setattr(dockers, 'engine', docker_engine)
+    fake_engine.add('a1', 'pihole')
+    docker_engine.start()
+    assert wait_until(lambda: docker_engine.available)
+    assert dockers.container_exists('pihole')
+    assert not dockers.container_exists('ollama')
+
+
+def run_without_sudo(monkeypatch):
+    """Runs `echo <password> | sudo -S <command>` as just <command>, there may be no sudo here."""
+    popen = dockers.subprocess.Popen
+
+    def fake_popen(command, *args, **kwargs):
+        return popen(re.sub(r'^echo .* \| sudo -S ', '', command), *args, **kwargs)
+
+    monkeypatch.setattr(dockers.subprocess, 'Popen', fake_popen)
+
+
+def test_streamed_commands_never_show_the_password(monkeypatch):
+    run_without_sudo(monkeypatch)
+    output = []
+    assert dockers.run_command("echo WEBPASSWORD='hunter2'", password='hunter2', on_output=output.append) == \
+        'WEBPASSWORD=***'
+    with pytest.raises(dockers.CommandError) as error:
+        dockers.run_command("echo token=s3cret; exit 3", password='hunter2', on_output=output.append,
+                            secrets=('s3cret',))
+    assert error.value.returncode == 3
+    for text in output + [str(error.value), error.value.command]:
+        assert 'hunter2' not in text and 's3cret' not in text
+    assert "$ echo WEBPASSWORD='***'" in output
+
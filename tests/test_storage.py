@@ -0,0 +1,220 @@
+import os
+import re
+from datetime import datetime
+
+import pytest
+
+import storage
+
+# MySQL runs only when a throwaway server is configured, the database is dropped and recreated
+MYSQL_HOST = os.environ.get('TEST_MYSQL_HOST')
+MYSQL_DATABASE = os.environ.get('TEST_MYSQL_DATABASE', 'homefusion_test')
+
+
+def mysql_statements():
+    """db.sql without its CREATE DATABASE / USE lines, one statement per item."""
+    with open(storage.SCHEMA_PATH) as f:
+        schema = re.sub(r'--[^\n]*', '', f.read())
+    return [statement.strip() for statement in schema.split(';')
+            if statement.strip() and not re.match(r'(CREATE\s+DATABASE|USE)\b', statement.strip(), re.IGNORECASE)]
+
+
+def open_mysql_store():
+    if not MYSQL_HOST:
+        pytest.skip("TEST_MYSQL_HOST is not set")
+    mysql_connector = pytest.importorskip('mysql.connector')
+    connect_args = {'host': MYSQL_HOST,
+                    'user': os.environ.get('TEST_MYSQL_USER', 'root'),
+                    'password': os.environ.get('TEST_MYSQL_PASSWORD', '')}
+    connection = mysql_connector.connect(**connect_args)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {MYSQL_DATABASE}")
+    cursor.execute(f"CREATE DATABASE {MYSQL_DATABASE}")
+    cursor.execute(f"USE {MYSQL_DATABASE}")
+    for statement in mysql_statements():
+        cursor.execute(statement)
+    connection.commit()
+    cursor.close()
+    connection.close()
+    return storage.open_store('mysql', pool_options={'size': 2}, database=MYSQL_DATABASE, **connect_args)
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        data_store = storage.open_store('sqlite', sqlite_path=str(tmp_path / 'homefusion.db'))
+    else:
+        data_store = open_mysql_store()
+    yield data_store
+    data_store.close()
+
+
+def add_users(store, *usernames):
+    for username in usernames:
+        store.create_user(username, f"hash-{username}")
+    return {user['username']: user['id'] for user in store.get_all_users()}
+
+
+def test_create_and_read_users(store):
+    ids = add_users(store, 'alice', 'bob')
+
+    user = store.get_user_by_username('alice')
+    assert user['id'] == ids['alice']
+    assert user['password'] == 'hash-alice'
+    assert store.get_user_by_username('carol') is None
+
+    store.update_user_password(ids['bob'], 'new-hash')
+    assert store.get_user_by_username('bob')['password'] == 'new-hash'
+
+
+def test_the_last_user_cannot_be_deleted(store):
+    ids = add_users(store, 'alice', 'bob')
+
+    store.delete_user(ids['alice'])
+    assert [user['username'] for user in store.get_all_users()] == ['bob']
+    with pytest.raises(storage.CannotDeleteLastUser):
+        store.delete_user(ids['bob'])
+
+
+def test_prefix_search_pages_by_username(store):
+    add_users(store, 'anna', 'andre', 'angela', 'bruno', 'ana')
+
+    rows, next_after = store.search_users('an', limit=2)
+    assert [row['username'] for row in rows] == ['ana', 'andre']
+    assert next_after == 'andre'
+
+    rows, next_after = store.search_users('an', after=next_after, limit=2)
+    assert [row['username'] for row in rows] == ['angela', 'anna']
+    assert next_after is None
+
+    rows, _ = store.search_users('', limit=10)
+    assert len(rows) == 5
+
+
+def test_substring_search_uses_trigrams(store):
+    add_users(store, 'alice', 'malice', 'bob', 'licorice')
+
+    rows, _ = store.search_users('lic', substring=True)
+    assert [row['username'] for row in rows] == ['alice', 'licorice', 'malice']
+
+    # Every trigram of 'alic' matches 'licorice' too, the LIKE weeds it out
+    rows, _ = store.search_users('alic', substring=True)
+    assert [row['username'] for row in rows] == ['alice', 'malice']
+
+    # Shorter than a trigram, still a prefix
+    rows, _ = store.search_users('bo', substring=True)
+    assert [row['username'] for row in rows] == ['bob']
+
+
+def test_users_added_behind_its_back_get_indexed(store):
+    with store.backend.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(store.backend.sql("INSERT INTO users (username, password) VALUES (%s, %s)"),
+                       ('legacy', 'hash'))
+        connection.commit()
+        cursor.close()
+    assert store.search_users('gac', substring=True)[0] == []
+
+    assert store.index_user_trigrams() == 1
+    assert [row['username'] for row in store.search_users('gac', substring=True)[0]] == ['legacy']
+    assert store.index_user_trigrams() == 0
+
+
+def test_added_tables_can_be_created_again(store):
+    store.create_added_tables()
+    store.create_added_tables()
+
+
+def test_preferences_table_is_added_and_backfilled(store):
+    ids = add_users(store, 'alice', 'bob')
+    store.apply_wallpaper_and_theme(ids['alice'], 'sky.jpg', 'dark')
+    store.apply_wallpaper_and_theme(ids['alice'], 'sea.jpg', 'light')
+    # A database from before user_preferences existed
+    with store.backend.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("DROP TABLE user_preferences")
+        connection.commit()
+        cursor.close()
+
+    store.create_added_tables()
+    assert store.get_preferences(ids['alice']) == {'wallpaper_path': 'sea.jpg', 'theme': 'light'}
+    assert store.get_preferences(ids['bob']) is None
+
+
+def test_quotas(store):
+    ids = add_users(store, 'alice', 'bob')
+
+    store.set_quota(ids['alice'], 'root/alice', 10)
+    store.set_quota(ids['alice'], 'root/alice', 20)
+    store.set_quota(ids['bob'], 'root/bob', 5)
+    assert store.list_quotas() == [
+        {'user_id': ids['alice'], 'username': 'alice', 'folder': 'root/alice', 'max_bytes': 20},
+        {'user_id': ids['bob'], 'username': 'bob', 'folder': 'root/bob', 'max_bytes': 5},
+    ]
+
+    store.delete_quota(ids['bob'])
+    # Deleting the user takes their quota with it
+    store.delete_user(ids['alice'])
+    assert store.list_quotas() == []
+
+
+def test_wallpaper_and_theme(store):
+    ids = add_users(store, 'alice')
+    assert store.get_preferences(ids['alice']) is None
+
+    store.apply_wallpaper_and_theme(ids['alice'], 'sky.jpg', 'dark')
+    store.apply_wallpaper_and_theme(ids['alice'], 'sea.jpg', 'light')
+    assert store.get_preferences(ids['alice']) == {'wallpaper_path': 'sea.jpg', 'theme': 'light'}
+    last = store.get_last_applied_wallpaper_and_theme(ids['alice'])
+    assert (last['wallpaper_path'], last['theme']) == ('sea.jpg', 'light')
+
+
+def add_access(store, user_id, *times):
+    store.insert_access([(user_id, 'Login Successful', '127.0.0.1', 'Linux', 'pytest', created_at)
+                         for created_at in times])
+
+
+def test_access_history_filters_by_time(store):
+    ids = add_users(store, 'alice', 'bob')
+    add_access(store, ids['alice'], '2024-05-01 09:00:00', '2024-05-01 10:10:00', '2024-05-01 10:20:00')
+    add_access(store, ids['bob'], '2024-05-01 10:30:00')
+
+    rows = store.access_history()
+    assert [row['created_at'] for row in rows] == [
+        datetime(2024, 5, 1, 10, 30), datetime(2024, 5, 1, 10, 20),
+        datetime(2024, 5, 1, 10, 10), datetime(2024, 5, 1, 9, 0)]
+    assert rows[0]['username'] == 'bob'
+
+    # As sent by <input type="datetime-local">
+    assert len(store.access_history(since='2024-05-01T10:00')) == 3
+    assert len(store.access_history(since='2024-05-01T10:00', until='2024-05-01T10:25')) == 2
+    assert len(store.access_history(since=datetime(2024, 5, 1, 10, 15))) == 2
+    assert len(store.access_history(user_id=ids['alice'], since='2024-05-01 10:00:00')) == 2
+    with pytest.raises(ValueError):
+        store.access_history(since='yesterday')
+
+
+def test_access_history_pages_through_rows_in_the_same_second(store):
+    ids = add_users(store, 'alice')
+    add_access(store, ids['alice'], *['2024-05-01 10:00:00'] * 3, '2024-05-01 09:00:00')
+
+    seen = []
+    before = None
+    while True:
+        rows = store.access_history(before=before, limit=2)
+        if not rows:
+            break
+        seen += [row['id'] for row in rows]
+        before = (rows[-1]['created_at'], rows[-1]['id'])
+    assert len(seen) == len(set(seen)) == 4
+
+
+def test_docker_containers(store):
+    assert [(container['name'], bool(container['installed'])) for container in store.list_docker_containers()] == \
+        [('pihole', False)]
+
+    store.set_container_installed('pihole')
+    assert bool(store.list_docker_containers()[0]['installed'])
+
+    store.delete_docker_container('pihole')
+    assert store.list_docker_containers() == []
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Without Pillow the file manager shows names only
+    Image = None
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+
+class ThumbnailError(Exception):
+    """Raised for files that are not images or cannot be decoded."""
+
+
+class ThumbnailTimeout(ThumbnailError):
+    """Raised when the workers did not get to a thumbnail in time."""
+
+
+def is_image(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+class ThumbnailCache:
+    """
+    JPEG thumbnails generated on first request and kept in a size-capped folder.
+
+    A thumbnail is keyed by the source's real path, mtime and size, so an
+    edited file simply gets a new key and the old thumbnail ages out. The
+    least recently used thumbnails are deleted once the folder grows past
+    `max_bytes`; every hit bumps the file's mtime so the order survives a
+    restart. Decoding runs on a small thread pool, and concurrent requests
+    for the same thumbnail share one job.
+
+    Args:
+        cache_folder (str): Where thumbnails are written.
+        max_bytes (int): Size the cache folder is kept under.
+        size (int): Longest side of a thumbnail in pixels.
+        workers (int): Images decoded at the same time.
+        quality (int): JPEG quality.
+    """
+
+    def __init__(self, cache_folder, max_bytes=256 * 1024 * 1024, size=256, workers=2, quality=75):
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.size = size
+        self.quality = quality
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+        self._lru = OrderedDict()
+        self._total = 0
+        self._pending = {}
+        # Reentrant: a job that finished already runs its done callback inside get()
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+        os.makedirs(cache_folder, exist_ok=True)
+        self._load()
+
+    def available(self):
+        return Image is not None
+
+    def _load(self):
+        entries = []
+        with os.scandir(self.cache_folder) as iterator:
+            for entry in iterator:
+                if entry.name.endswith('.tmp'):
+                    os.remove(entry.path)
+                elif entry.name.endswith('.jpg'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            for _, name, size in sorted(entries):
+                self._lru[name] = size
+                self._total += size
+            self._evict_locked()
+
+    def _key(self, path, stat):
+        source = f"{os.path.realpath(path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{self.size}"
+        return hashlib.sha1(source.encode('utf-8', 'surrogateescape')).hexdigest() + '.jpg'
+
+    def _evict_locked(self):
+        while self._total > self.max_bytes and self._lru:
+            name, size = self._lru.popitem(last=False)
+            self._total -= size
+            self.stats['evicted'] += 1
+            try:
+                os.remove(os.path.join(self.cache_folder, name))
+            except OSError:
+                pass
+
+    def _render(self, path, name):
+        destination = os.path.join(self.cache_folder, name)
+        try:
+            with Image.open(path) as image:
+                # JPEGs decode straight at 1/2..1/8 scale, much cheaper than a full decode
+                image.draft('RGB', (self.size, self.size))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((self.size, self.size))
+                if image.mode != 'RGB':
+                    background = Image.new('RGB', image.size, 'white')
+                    image = image.convert('RGBA')
+                    background.paste(image, mask=image.split()[-1])
+                    image = background
+                temporary = destination + '.tmp'
+                image.save(temporary, 'JPEG', quality=self.quality, optimize=True)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise ThumbnailError(f"Cannot make a thumbnail of this file: {e}")
+        os.replace(temporary, destination)
+        size = os.path.getsize(destination)
+        with self._lock:
+            self._lru[name] = size
+            self._total += size
+            self._evict_locked()
+        return destination
+
+    def get(self, path, timeout=30):
+        """Returns the path of the thumbnail of `path`, generating it if needed."""
+        if Image is None:
+            raise ThumbnailError("Pillow is not installed")
+        if not is_image(path):
+            raise ThumbnailError("Not an image")
+        stat = os.stat(path)
+        name = self._key(path, stat)
+        destination = os.path.join(self.cache_folder, name)
+        with self._lock:
+            if name in self._lru:
+                self._lru.move_to_end(name)
+                self.stats['hits'] += 1
+                hit = True
+            else:
+                hit = False
+                self.stats['misses'] += 1
+                future = self._pending.get(name)
+                if future is None:
+                    future = self._executor.submit(self._render, path, name)
+                    self._pending[name] = future
+                    future.add_done_callback(lambda _: self._forget_pending(name))
+        if hit:
+            try:
+                os.utime(destination)
+                return destination
+            except FileNotFoundError:
+                # Removed behind our back, build it again
+                with self._lock:
+                    self._total -= self._lru.pop(name, 0)
+                return self.get(path, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            raise ThumbnailTimeout("Thumbnail is still being generated")
+
+    def _forget_pending(self, name):
+        with self._lock:
+            self._pending.pop(name, None)
+
+    def usage(self):
+        with self._lock:
+            return dict(self.stats, files=len(self._lru), bytes=self._total, max_bytes=self.max_bytes)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
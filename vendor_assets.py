@@ -0,0 +1,34 @@
+import os
+import urllib.request
+
+# Pinned front-end assets served from static/vendor instead of a CDN
+VENDOR_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'vendor')
+ASSETS = {
+    'xterm/xterm.min.css': 'https://cdn.jsdelivr.net/npm/xterm@5.3.0/css/xterm.min.css',
+    'xterm/xterm.min.js': 'https://cdn.jsdelivr.net/npm/xterm@5.3.0/lib/xterm.min.js',
+    'xterm/xterm-addon-fit.min.js': 'https://cdn.jsdelivr.net/npm/xterm-addon-fit@0.8.0/lib/xterm-addon-fit.min.js',
+}
+
+
+def vendored(names=ASSETS):
+    """True when every asset in `names` is in VENDOR_FOLDER."""
+    return all(os.path.isfile(os.path.join(VENDOR_FOLDER, name)) for name in names)
+
+
+def download(name, url):
+    path = os.path.join(VENDOR_FOLDER, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with urllib.request.urlopen(url, timeout=30) as response:
+        data = response.read()
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+    return len(data)
+
+
+if __name__ == '__main__':
+    for name, url in ASSETS.items():
+        try:
+            print(f"{name}: {download(name, url)} bytes")
+        except Exception as e:
+            print(f"Erro ao baixar {url}: {e}")
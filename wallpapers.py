@@ -0,0 +1,224 @@
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Without Pillow the originals are served as they are
+    Image = None
+
+WIDTHS = (640, 1280, 1920, 2560)
+THUMBNAIL_WIDTH = 320
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+SOURCE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def secure_stem(name):
+    """Keeps variant names to safe URL characters."""
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+
+
+def _resize(image, width):
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+class WallpaperAssets:
+    """
+    Resized WebP/JPEG variants and picker thumbnails of the wallpapers.
+
+    Every variant is named after the hash of its own bytes
+    (`canyon-1280w.3f2a9c1e04b7.webp`), so it can be cached forever: a new
+    upload under the same name produces new file names. manifest.json
+    remembers which source hash each set was built from, so a restart only
+    rebuilds wallpapers that changed.
+
+    Args:
+        source_folder (str): Folder with the original wallpapers.
+        output_folder (str): Folder the variants are written to, served as static files.
+        url_prefix (str): URL the output folder is served under.
+        widths (tuple): Variant widths in pixels; never larger than the original.
+        thumbnail_width (int): Width of the picker thumbnails.
+        quality (int): WebP/JPEG quality.
+    """
+
+    def __init__(self, source_folder, output_folder, url_prefix, widths=WIDTHS,
+                 thumbnail_width=THUMBNAIL_WIDTH, quality=80):
+        self.source_folder = source_folder
+        self.output_folder = output_folder
+        self.url_prefix = url_prefix.rstrip('/') + '/'
+        self.widths = tuple(sorted(widths))
+        self.thumbnail_width = thumbnail_width
+        self.quality = quality
+        self.manifest_path = os.path.join(output_folder, 'manifest.json')
+        self._manifest = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def available(self):
+        return Image is not None
+
+    def sources(self):
+        """Names of the original wallpapers."""
+        try:
+            names = os.listdir(self.source_folder)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names
+                      if os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS
+                      and os.path.isfile(os.path.join(self.source_folder, name)))
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        with self._lock:
+            self._manifest = manifest
+
+    def _save_manifest(self):
+        with self._lock:
+            data = json.dumps(self._manifest, indent=1, sort_keys=True)
+        temporary = self.manifest_path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(data)
+        os.replace(temporary, self.manifest_path)
+
+    def _write(self, image, stem, suffix, extension, image_format):
+        buffer = io.BytesIO()
+        options = {'quality': self.quality}
+        if image_format == 'JPEG':
+            options.update(optimize=True, progressive=True)
+        else:
+            options['method'] = 4
+        image.save(buffer, image_format, **options)
+        data = buffer.getvalue()
+        filename = f"{stem}-{suffix}.{hashlib.sha256(data).hexdigest()[:12]}.{extension}"
+        path = os.path.join(self.output_folder, filename)
+        if not os.path.exists(path):
+            temporary = path + '.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        return filename
+
+    @staticmethod
+    def _files(entry):
+        files = [variant[extension] for variant in entry['variants'] for extension, _ in FORMATS]
+        return files + [entry['thumbnail'][extension] for extension, _ in FORMATS]
+
+    def generate(self, name):
+        """Builds the variants of one wallpaper unless they are already up to date."""
+        if Image is None:
+            return None
+        path = os.path.join(self.source_folder, name)
+        digest = file_digest(path)
+        with self._lock:
+            entry = self._manifest.get(name)
+        if entry and entry.get('source') == digest and all(
+                os.path.exists(os.path.join(self.output_folder, filename)) for filename in self._files(entry)):
+            return entry
+
+        os.makedirs(self.output_folder, exist_ok=True)
+        stem = os.path.splitext(secure_stem(name))[0]
+        with Image.open(path) as original:
+            image = ImageOps.exif_transpose(original).convert('RGB')
+        variants = []
+        for width in sorted({min(width, image.width) for width in self.widths}):
+            resized = _resize(image, width)
+            variant = {'width': resized.width, 'height': resized.height}
+            for extension, image_format in FORMATS:
+                variant[extension] = self._write(resized, stem, f'{resized.width}w', extension, image_format)
+            variants.append(variant)
+        thumbnail_image = _resize(image, self.thumbnail_width)
+        thumbnail = {extension: self._write(thumbnail_image, stem, 'thumb', extension, image_format)
+                     for extension, image_format in FORMATS}
+
+        new_entry = {'source': digest, 'variants': variants, 'thumbnail': thumbnail}
+        with self._lock:
+            self._manifest[name] = new_entry
+        self._save_manifest()
+        if entry:
+            self._remove_files(set(self._files(entry)) - set(self._files(new_entry)))
+        return new_entry
+
+    def _remove_files(self, filenames):
+        for filename in filenames:
+            try:
+                os.remove(os.path.join(self.output_folder, filename))
+            except OSError:
+                pass
+
+    def scan(self):
+        """Builds whatever is missing or stale and drops the variants of deleted wallpapers."""
+        self._load_manifest()
+        names = self.sources()
+        for name in names:
+            try:
+                self.generate(name)
+            except Exception as e:
+                print(f"Erro ao gerar as variantes de {name}: {e}")
+        with self._lock:
+            removed = {name: self._manifest.pop(name) for name in list(self._manifest) if name not in names}
+        if removed:
+            self._save_manifest()
+            for entry in removed.values():
+                self._remove_files(self._files(entry))
+
+    def add(self, name):
+        """Queues a newly uploaded wallpaper for the background worker."""
+        self._queue.put(name)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._load_manifest()
+        if Image is None:
+            print("Pillow não está instalado, os wallpapers serão servidos sem variantes")
+            return
+        self._thread = threading.Thread(target=self._run, name='wallpaper-variants', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self.scan()
+        while True:
+            name = self._queue.get()
+            try:
+                self.generate(name)
+            except Exception as e:
+                print(f"Erro ao gerar as variantes de {name}: {e}")
+
+    def variants(self, name):
+        """[{width, height, webp, jpeg}] as URLs, smallest first; empty until generated."""
+        with self._lock:
+            entry = self._manifest.get(name)
+        if not entry:
+            return []
+        return [dict(variant,
+                     webp=self.url_prefix + variant['webp'],
+                     jpeg=self.url_prefix + variant['jpeg'])
+                for variant in entry['variants']]
+
+    def thumbnail(self, name):
+        """{webp, jpeg} thumbnail URLs, or None until generated."""
+        with self._lock:
+            entry = self._manifest.get(name)
+        if not entry:
+            return None
+        return {extension: self.url_prefix + filename for extension, filename in entry['thumbnail'].items()}